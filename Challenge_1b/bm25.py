@@ -0,0 +1,160 @@
+import hashlib
+import os
+import re
+import tempfile
+import zipfile
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"\b[a-z0-9]+\b")
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def corpus_fingerprint(texts):
+    digest = hashlib.sha1()
+    for text in texts:
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class BM25Index:
+    """Inverted index in CSR form: for term t, postings live in doc_ids/tfs[offsets[t]:offsets[t + 1]]."""
+
+    def __init__(self, vocabulary, offsets, doc_ids, tfs, doc_lens, fingerprint="", k1=1.5, b=0.75):
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_lens = doc_lens
+        self.fingerprint = fingerprint
+        self.k1 = k1
+        self.b = b
+        self.avg_len = float(doc_lens.mean()) if len(doc_lens) else 0.0
+
+    def __len__(self):
+        return len(self.doc_lens)
+
+    # --- BUILD ---
+    @classmethod
+    def build(cls, texts, **params):
+        postings = {}
+        doc_lens = np.zeros(len(texts), dtype=np.int32)
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lens[doc_id] = len(tokens)
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                postings.setdefault(token, []).append((doc_id, tf))
+
+        vocabulary = {term: i for i, term in enumerate(sorted(postings))}
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        for term, i in vocabulary.items():
+            offsets[i + 1] = len(postings[term])
+        np.cumsum(offsets, out=offsets)
+
+        doc_ids = np.empty(offsets[-1], dtype=np.int32)
+        tfs = np.empty(offsets[-1], dtype=np.float32)
+        for term, i in vocabulary.items():
+            entries = np.array(postings[term], dtype=np.int64).reshape(-1, 2)
+            doc_ids[offsets[i]:offsets[i + 1]] = entries[:, 0]
+            tfs[offsets[i]:offsets[i + 1]] = entries[:, 1]
+
+        return cls(vocabulary, offsets, doc_ids, tfs, doc_lens, corpus_fingerprint(texts), **params)
+
+    # --- QUERY ---
+    def search(self, query_terms, k=None):
+        """Score only documents that contain a query term; returns (doc_ids, scores) best first."""
+        n_docs = len(self)
+        hit_ids, hit_scores = [], []
+        for term in set(query_terms):
+            i = self.vocabulary.get(term)
+            if i is None:
+                continue
+            ids = self.doc_ids[self.offsets[i]:self.offsets[i + 1]]
+            tf = self.tfs[self.offsets[i]:self.offsets[i + 1]]
+            idf = np.log(1.0 + (n_docs - len(ids) + 0.5) / (len(ids) + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * self.doc_lens[ids] / max(self.avg_len, 1e-9))
+            hit_ids.append(ids)
+            hit_scores.append(idf * tf * (self.k1 + 1.0) / (tf + norm))
+
+        if not hit_ids:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64)
+
+        candidates, inverse = np.unique(np.concatenate(hit_ids), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(hit_scores))
+        if k is not None and len(candidates) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            candidates, scores = candidates[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return candidates[order], scores[order]
+
+    def normalized_scores(self, query_terms, k=None):
+        # Dense [0, 1] column aligned with the indexed texts; non-candidates score 0
+        column = np.zeros(len(self), dtype=np.float64)
+        ids, scores = self.search(query_terms, k)
+        if len(ids) and scores[0] > 0:
+            column[ids] = scores / scores[0]
+        return column
+
+    # --- PERSISTENCE ---
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        # Private temp file per writer, so concurrent jobs never write or publish each other's half-files
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp.npz")
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, terms=np.array(terms, dtype=str), offsets=self.offsets, doc_ids=self.doc_ids,
+                     tfs=self.tfs, doc_lens=self.doc_lens, fingerprint=np.array(self.fingerprint),
+                     params=np.array([self.k1, self.b]))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            vocabulary = {term: i for i, term in enumerate(data["terms"].tolist())}
+            k1, b = data["params"].tolist()
+            return cls(vocabulary, data["offsets"], data["doc_ids"], data["tfs"], data["doc_lens"],
+                       str(data["fingerprint"]), k1=k1, b=b)
+
+
+def load_or_build(texts, index_dir, keep=8):
+    """Reuse the index saved for exactly these texts, otherwise build and save it.
+
+    Indexes are stored per corpus fingerprint, so jobs over different document sets do not evict each other;
+    only the keep most recently used ones are kept.
+    """
+    fingerprint = corpus_fingerprint(texts)
+    path = os.path.join(index_dir, f"{fingerprint}.npz")
+    try:
+        index = BM25Index.load(path)
+        if index.fingerprint == fingerprint:
+            os.utime(path)
+            return index
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+        pass  # missing, or pruned by another process while loading
+
+    index = BM25Index.build(texts)
+    index.save(path)
+    prune_indexes(index_dir, keep)
+    return index
+
+
+def prune_indexes(index_dir, keep):
+    saved = []
+    for entry in os.scandir(index_dir):
+        if entry.name.endswith(".npz") and ".tmp" not in entry.name:
+            try:
+                saved.append((entry.stat().st_mtime, entry.path))
+            except FileNotFoundError:
+                continue  # pruned by another process meanwhile
+    for _, path in sorted(saved, reverse=True)[keep:]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
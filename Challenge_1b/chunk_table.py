@@ -0,0 +1,106 @@
+from statistics import mean
+
+import numpy as np
+
+
+class ChunkTable:
+    """Columnar view of the chunk list: scores and section membership as NumPy arrays."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        section_index = {}
+        self.section_ids = np.fromiter(
+            (section_index.setdefault((c['document'], c['section_title']), len(section_index)) for c in chunks),
+            dtype=np.int64, count=len(chunks)
+        )
+        self.section_keys = list(section_index)
+        self.pages = np.fromiter((c['page_number'] for c in chunks), dtype=np.int64, count=len(chunks))
+        self.columns = {}
+        self.retained = np.ones(len(chunks), dtype=bool)
+        self.embeddings = None
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def set_scores(self, columns, threshold):
+        # Chunks below the cosine threshold stay in the table but are excluded from aggregation
+        self.columns = columns
+        self.retained = columns["cosine_similarity"] >= threshold
+        return int(self.retained.sum())
+
+    def set_embeddings(self, embeddings):
+        # Chunk vectors from the scoring stage, indexed by chunk position (matrix, stored or subset vectors)
+        self.embeddings = embeddings
+
+    def section_means(self):
+        """Vectorized group-by: mean retained score, first and last retained row per section."""
+        n_sections = len(self.section_keys)
+        rows = np.flatnonzero(self.retained)
+        ids = self.section_ids[rows]
+
+        counts = np.bincount(ids, minlength=n_sections)
+        sums = np.bincount(ids, weights=self.columns["score"][rows], minlength=n_sections)
+        means = np.divide(sums, counts, out=np.zeros(n_sections), where=counts > 0)
+
+        first = np.full(n_sections, len(self), dtype=np.int64)
+        last = np.full(n_sections, -1, dtype=np.int64)
+        np.minimum.at(first, ids, rows)
+        np.maximum.at(last, ids, rows)
+        return means, counts, first, last
+
+    def section_rows(self, section_ids):
+        # Retained rows of each requested section, in chunk order
+        rows = np.flatnonzero(self.retained & np.isin(self.section_ids, section_ids))
+        rows = rows[np.argsort(self.section_ids[rows], kind="stable")]
+        ids = self.section_ids[rows]
+        starts = np.searchsorted(ids, section_ids, side="left")
+        ends = np.searchsorted(ids, section_ids, side="right")
+        return {int(sid): rows[start:end] for sid, start, end in zip(section_ids, starts, ends)}
+
+    def top_sections(self, drop_ratio, max_sections):
+        means, counts, first, last = self.section_means()
+        present = np.flatnonzero(counts > 0)
+        if not len(present):
+            return []
+
+        # Only the best max_sections + 1 sections can matter for the gap cutoff
+        k = max_sections + 1
+        candidates = present
+        if len(present) > k:
+            kth = means[present][np.argpartition(-means[present], k - 1)[k - 1]]
+            candidates = present[means[present] >= kth - 1e-9]
+
+        # Exact means for the few candidates, so equal-score sections tie exactly
+        section_rows = self.section_rows(candidates)
+        exact = np.array([mean(self.columns["score"][section_rows[sid]].tolist()) for sid in candidates])
+        # Ties keep first-seen order, like the stable sort over grouped sections
+        by_rank = np.lexsort((first[candidates], -exact))
+        order = candidates[by_rank]
+
+        avg_scores = exact[by_rank]
+        gaps = np.flatnonzero(avg_scores[:-1] - avg_scores[1:] > drop_ratio * avg_scores[0])
+        cutoff_idx = gaps[0] + 1 if len(gaps) else len(avg_scores)
+        cutoff_idx = min(cutoff_idx, max_sections)
+
+        top_sections = []
+        for rank, (section_id, avg_score) in enumerate(zip(order[:cutoff_idx], avg_scores), 1):
+            chunks = []
+            for i in section_rows[section_id]:
+                c = self.chunks[i]
+                c.update({name: float(self.columns[name][i]) for name in ("score", "cosine_similarity", "keyword_score")})
+                if self.embeddings is not None:
+                    c["embedding"] = self.embeddings[i]
+                chunks.append(c)
+
+            document, section_title = self.section_keys[section_id]
+            top_sections.append({
+                'document': document,
+                'section_title': section_title,
+                'page_number': int(self.pages[last[section_id]]),
+                'scores': [c['score'] for c in chunks],
+                'chunks': chunks,
+                'avg_score': float(avg_score),
+                'importance_rank': rank
+            })
+
+        return top_sections
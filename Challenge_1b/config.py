@@ -1,8 +1,34 @@
+import os
+
 EMBEDDING_PATH = "./bge-local"
+# "bucketed" = length-bucketed EmbeddingEngine, "default" = plain HuggingFaceEmbeddings
+EMBEDDING_ENGINE = "bucketed"
+EMBEDDING_INTRA_OP_THREADS = os.cpu_count() or 1  # torch intra-op threads (orchestrator.py lowers this, see there)
+EMBEDDING_INTER_OP_THREADS = 1                    # torch inter-op threads; batches run one after another
 COSINE_THRESHOLD = 0.65
-ENABLE_HARD_KEYWORD_FILTER = False
+# Chunk vectors for scoring: "float32" (exact), "float16" or "int8" (compressed first pass + exact re-scoring)
+VECTOR_PRECISION = "float32"
+ENABLE_HARD_KEYWORD_FILTER = False  # cascade mode: lexical/section-title prefilter before embedding
+PREFILTER_RECALL_MARGIN = 0.1       # always embed at least this fraction of chunks
+PREFILTER_MIN_KEEP = 50             # ...and at least this many
 
 JOB_PERFORMER_PATH = "./flan-t5-small"
+# "abstractive" = flan-t5 generation, "extractive" = pick query-relevant sentences with the embedding model
+SUMMARY_MODE = "abstractive"
+EXTRACTIVE_METHOD = "mmr"     # "mmr" (relevance + diversity) or "centroid" (top relevance only)
+EXTRACTIVE_SENTENCES = 3      # sentences kept per passage
 
 MAX_SECTIONS = 10
-DROP_RATIO = 0.1
\ No newline at end of file
+DROP_RATIO = 0.1
+
+# Summarization budget for Step 8 (None = unlimited)
+SUMMARY_TOKEN_BUDGET = None   # total words of passage text sent to the summarizer
+SUMMARY_TIME_BUDGET = None    # seconds
+LOW_VALUE_RATIO = 0.5         # chunks below this fraction of the section's best score are merged
+# Pack adjacent passages of a section into one flan-t5 prompt, measured with the bundled tokenizer
+PACK_PROMPTS = False
+PACK_MAX_INPUT_TOKENS = None  # None = tokenizer's model_max_length
+
+# Lexical half of the hybrid score: "keyword" (query keyword hit ratio) or "bm25" (inverted index)
+LEXICAL_SCORER = "keyword"
+BM25_CANDIDATES = 200         # chunks kept from the BM25 ranking for fusion with cosine scores
@@ -0,0 +1,164 @@
+import mmap
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+# Layout (little endian, every section 8-byte aligned):
+#   header   magic, version, row count, embedding dim, then (offset, length) per section
+#   strings  for each string column: uint64 offsets[rows + 1] followed by the UTF-8 blob
+#   page     int32[rows]
+#   embedding float32[rows, dim] (only when dim > 0)
+MAGIC = b"RWCORPUS"
+VERSION = 1
+STRING_COLUMNS = ("document", "section_title", "text")
+SECTIONS = tuple(f"{name}_{part}" for name in STRING_COLUMNS for part in ("offsets", "blob")) + ("page", "embedding")
+HEADER = struct.Struct("<8sIQI" + "QQ" * len(SECTIONS))
+
+
+def _pad(size):
+    return (-size) % 8
+
+
+# --- WRITER ---
+def write_corpus(path, records, embeddings=None):
+    """Write records (dicts with document, section_title, page_number, text) as one binary file."""
+    rows = len(records)
+    dim = 0
+    if embeddings is not None and rows:
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32).reshape(rows, -1)
+        dim = embeddings.shape[1]
+
+    payload = {}
+    for name in STRING_COLUMNS:
+        encoded = [r[name].encode("utf-8") for r in records]
+        offsets = np.zeros(rows + 1, dtype=np.uint64)
+        offsets[1:] = np.cumsum([len(e) for e in encoded], dtype=np.uint64)
+        payload[f"{name}_offsets"] = offsets.tobytes()
+        payload[f"{name}_blob"] = b"".join(encoded)
+    payload["page"] = np.array([r["page_number"] for r in records], dtype=np.int32).tobytes()
+    payload["embedding"] = embeddings.tobytes() if dim else b""
+
+    table = []
+    position = HEADER.size + _pad(HEADER.size)
+    for name in SECTIONS:
+        table.extend((position, len(payload[name])))
+        position += len(payload[name]) + _pad(len(payload[name]))
+
+    # Unique temp name per writer: process_pdfs, the orchestrator, watch and shard merges share one corpus
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, rows, dim, *table))
+            f.write(b"\0" * _pad(HEADER.size))
+            for name in SECTIONS:
+                f.write(payload[name])
+                f.write(b"\0" * _pad(len(payload[name])))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+# --- READER ---
+class Corpus:
+    """Memory-mapped, read-only view of a corpus file; columns are decoded lazily per row."""
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.rows, self.dim, *table = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a corpus file (v{VERSION}): {path}")
+
+        self._sections = {name: (table[2 * i], table[2 * i + 1]) for i, name in enumerate(SECTIONS)}
+        self._offsets = {name: self._array(f"{name}_offsets", np.uint64) for name in STRING_COLUMNS}
+        self.pages = self._array("page", np.int32)
+        self.embeddings = self._array("embedding", np.float32).reshape(self.rows, self.dim) if self.dim else None
+        self._doc_ranges = None
+
+    def _array(self, name, dtype):
+        offset, length = self._sections[name]
+        return np.frombuffer(self._map, dtype=dtype, count=length // np.dtype(dtype).itemsize, offset=offset)
+
+    def string(self, column, i):
+        blob_offset = self._sections[f"{column}_blob"][0]
+        offsets = self._offsets[column]
+        return self._map[blob_offset + int(offsets[i]):blob_offset + int(offsets[i + 1])].decode("utf-8")
+
+    def row(self, i):
+        return {
+            "document": self.string("document", i),
+            "section_title": self.string("section_title", i),
+            "page_number": int(self.pages[i]),
+            "text": self.string("text", i)
+        }
+
+    def __len__(self):
+        return self.rows
+
+    def document_rows(self, document):
+        # Rows of a document are written contiguously
+        if self._doc_ranges is None:
+            self._doc_ranges = {}
+            for i in range(self.rows):
+                name = self.string("document", i)
+                start, _ = self._doc_ranges.get(name, (i, i))
+                self._doc_ranges[name] = (start, i + 1)
+        return range(*self._doc_ranges.get(document, (0, 0)))
+
+    def close(self):
+        self.embeddings = self.pages = self._offsets = None
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# --- OUTLINE CONVERSION ---
+def outline_records(filename, doc_data):
+    return [
+        {
+            "document": filename,
+            "section_title": section["text"],
+            "page_number": section.get("page", 1),
+            "text": section.get("text_content", "")
+        } for section in doc_data.get("outline", [])
+    ]
+
+
+def replace_documents(path, updates, embeddings=None):
+    """Rewrite a corpus once with several documents' rows replaced; updates maps filename -> records (None removes).
+
+    embeddings optionally maps filename -> float32[rows, dim] for the new rows. An existing embedding column is
+    carried through the rewrite, so it then needs vectors for every document that gains rows.
+    """
+    if not updates:
+        return
+    embeddings = embeddings or {}
+    kept, kept_embs = [], None
+    if os.path.exists(path):
+        with Corpus(path) as corpus:
+            rows = [i for i in range(len(corpus)) if corpus.string("document", i) not in updates]
+            kept = [corpus.row(i) for i in rows]
+            if corpus.embeddings is not None and rows:
+                kept_embs = np.array(corpus.embeddings[rows])  # copied before the map closes
+
+    added = [filename for filename, records in updates.items() if records]
+    records = kept + [r for filename in added for r in updates[filename]]
+    if kept_embs is None and (kept or not embeddings):
+        write_corpus(path, records)
+        return
+
+    missing = [filename for filename in added if filename not in embeddings]
+    if missing:
+        raise ValueError(f"Corpus {path} has an embedding column; no embeddings given for {', '.join(missing)}")
+    vectors = ([kept_embs] if kept_embs is not None else []) + \
+              [np.asarray(embeddings[filename], dtype=np.float32).reshape(len(updates[filename]), -1) for filename in added]
+    write_corpus(path, records, np.vstack(vectors) if vectors else None)
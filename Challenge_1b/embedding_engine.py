@@ -0,0 +1,85 @@
+import time
+
+import numpy as np
+import torch
+from sentence_transformers import SentenceTransformer
+
+# Upper token bound of each length bucket; longer inputs are truncated by the model anyway
+BUCKET_BOUNDS = (32, 64, 128, 256, 512)
+TOKENS_PER_BATCH = 8192   # padded tokens per forward pass; short buckets get larger batches
+MAX_BATCH_SIZE = 256
+
+
+def configure_threads(intra_op=None, inter_op=None):
+    # Explicit torch thread counts so embedding does not oversubscribe cores shared with worker processes
+    if intra_op:
+        torch.set_num_threads(intra_op)
+    if inter_op:
+        try:
+            torch.set_num_interop_threads(inter_op)
+        except RuntimeError:
+            # Can only be set once, before any inter-op parallel work has started
+            print("⚠️ torch inter-op threads already initialized, keeping current setting.")
+
+
+class EmbeddingEngine:
+    """Drop-in replacement for HuggingFaceEmbeddings that batches inputs by token length."""
+
+    def __init__(self, model_path, intra_op_threads=None, inter_op_threads=None,
+                 bucket_bounds=BUCKET_BOUNDS, tokens_per_batch=TOKENS_PER_BATCH):
+        configure_threads(intra_op_threads, inter_op_threads)
+        self.model = SentenceTransformer(model_path, device="cpu")
+        self.max_length = self.model.max_seq_length
+        self.bucket_bounds = tuple(b for b in bucket_bounds if b < self.max_length) + (self.max_length,)
+        self.tokens_per_batch = tokens_per_batch
+        self.stats = []
+
+    def token_lengths(self, texts):
+        encoded = self.model.tokenizer(texts, add_special_tokens=True, truncation=True,
+                                       max_length=self.max_length, return_attention_mask=False)
+        return np.array([len(ids) for ids in encoded["input_ids"]], dtype=np.int64)
+
+    def batch_size(self, bound):
+        return max(1, min(MAX_BATCH_SIZE, self.tokens_per_batch // bound))
+
+    def embed_documents(self, texts):
+        # Same preprocessing as HuggingFaceEmbeddings
+        texts = [t.replace("\n", " ") for t in texts]
+        if not texts:
+            return []
+
+        lengths = self.token_lengths(texts)
+        bucket_of = np.searchsorted(self.bucket_bounds, lengths, side="left")
+        embeddings = np.empty((len(texts), self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+
+        self.stats = []
+        for bucket, bound in enumerate(self.bucket_bounds):
+            rows = np.flatnonzero(bucket_of == bucket)
+            if not len(rows):
+                continue
+            rows = rows[np.argsort(lengths[rows], kind="stable")]
+            batch_size = self.batch_size(bound)
+
+            start = time.perf_counter()
+            embeddings[rows] = self.model.encode([texts[i] for i in rows], batch_size=batch_size,
+                                                 convert_to_numpy=True, show_progress_bar=False)
+            elapsed = time.perf_counter() - start
+
+            self.stats.append({
+                "bucket_max_tokens": bound,
+                "texts": len(rows),
+                "batch_size": batch_size,
+                "seconds": round(elapsed, 3),
+                "texts_per_second": round(len(rows) / elapsed, 1) if elapsed else 0.0,
+                "tokens_per_second": round(int(lengths[rows].sum()) / elapsed, 1) if elapsed else 0.0
+            })
+
+        return embeddings.tolist()
+
+    def embed_query(self, text):
+        return self.model.encode(text.replace("\n", " "), convert_to_numpy=True, show_progress_bar=False).tolist()
+
+    def report(self):
+        for row in self.stats:
+            print(f"   ≤{row['bucket_max_tokens']:>3} tokens: {row['texts']:>5} texts, batch {row['batch_size']:>3}, "
+                  f"{row['texts_per_second']:>8.1f} texts/s, {row['tokens_per_second']:>9.1f} tokens/s")
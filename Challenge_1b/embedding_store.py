@@ -0,0 +1,153 @@
+import os
+from pathlib import Path
+
+import numpy as np
+
+from config import VECTOR_PRECISION
+from vector_store import QuantizedVectors, quantize
+
+EMBEDDING_DIR = "/app/embeddings"
+BM25_INDEX_DIR = os.path.join(EMBEDDING_DIR, ".bm25")  # one index file per corpus fingerprint
+
+
+# --- PER-DOCUMENT CHUNK EMBEDDINGS ---
+# <doc>.npz holds chunk_text plus either the float32 "embeddings" or, at reduced VECTOR_PRECISION, the
+# quantized codes/scales/norms; the float32 vectors then sit in <doc>.f32.npy, memory-mapped for re-scoring.
+def store_path(filename, store_dir=EMBEDDING_DIR):
+    return os.path.join(store_dir, Path(filename).with_suffix('.npz').name)
+
+
+def vectors_path(filename, store_dir=EMBEDDING_DIR):
+    return os.path.join(store_dir, Path(filename).with_suffix('.f32.npy').name)
+
+
+def store_files(filename, store_dir=EMBEDDING_DIR):
+    return [path for path in (store_path(filename, store_dir), vectors_path(filename, store_dir))
+            if os.path.exists(path)]
+
+
+def save_doc_embeddings(filename, chunks, embeddings, store_dir=EMBEDDING_DIR, precision=VECTOR_PRECISION):
+    os.makedirs(store_dir, exist_ok=True)
+    path = store_path(filename, store_dir)
+    # A document without chunks (blank or text-less PDF) still gets an empty entry
+    embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(chunks), -1) if chunks \
+        else np.zeros((0, 0), dtype=np.float32)
+    arrays = {"chunk_text": np.array([c["chunk_text"] for c in chunks], dtype=str)}
+
+    if precision == "float32":
+        arrays["embeddings"] = embeddings
+    else:
+        codes, scales, norms = quantize(embeddings, precision)
+        arrays.update(codes=codes, norms=norms, precision=np.array(precision))
+        if scales is not None:
+            arrays["scales"] = scales
+        # The float32 sidecar goes first; the .npz replace below is what readers see
+        vectors_tmp = f"{vectors_path(filename, store_dir)}.{os.getpid()}.tmp.npy"
+        np.save(vectors_tmp, embeddings)
+        os.replace(vectors_tmp, vectors_path(filename, store_dir))
+
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)  # readers never see a half-written file
+    if precision == "float32" and os.path.exists(vectors_path(filename, store_dir)):
+        os.remove(vectors_path(filename, store_dir))
+
+
+def load_doc_embeddings(filename, store_dir=EMBEDDING_DIR):
+    path = store_path(filename, store_dir)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        texts = list(data["chunk_text"])
+        if "embeddings" in data.files:
+            return texts, data["embeddings"]
+    return texts, np.load(vectors_path(filename, store_dir), mmap_mode="r")
+
+
+def load_doc_vectors(filename, store_dir=EMBEDDING_DIR):
+    """Quantized entry of a document: (chunk_text, precision, codes, scales, norms), or None if not quantized."""
+    path = store_path(filename, store_dir)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        if "codes" not in data.files:
+            return None
+        scales = data["scales"] if "scales" in data.files else None
+        return list(data["chunk_text"]), str(data["precision"]), data["codes"], scales, data["norms"]
+
+
+def remove_doc_embeddings(filename, store_dir=EMBEDDING_DIR):
+    for path in store_files(filename, store_dir):
+        os.remove(path)
+
+
+def chunk_positions(chunks, stored):
+    # (document, row within the document's stored entry) for every chunk, in chunk order
+    offsets = {filename: 0 for filename in stored}
+    positions = []
+    for c in chunks:
+        positions.append((c["document"], offsets[c["document"]]))
+        offsets[c["document"]] += 1
+    return positions
+
+
+def chunk_texts_by_doc(chunks):
+    by_doc = {}
+    for c in chunks:
+        by_doc.setdefault(c["document"], []).append(c["chunk_text"])
+    return by_doc
+
+
+def lookup_chunk_embeddings(chunks, store_dir=EMBEDDING_DIR):
+    """Return stored embeddings aligned with chunks, or None if any document is missing or stale."""
+    stored = {}
+    for filename, texts in chunk_texts_by_doc(chunks).items():
+        entry = load_doc_embeddings(filename, store_dir)
+        if entry is None or entry[0] != texts:
+            return None
+        stored[filename] = entry[1]
+
+    rows = [stored[filename][i] for filename, i in chunk_positions(chunks, stored)]
+    return np.vstack(rows) if rows else None
+
+
+def lookup_chunk_vectors(chunks, store_dir=EMBEDDING_DIR, precision=VECTOR_PRECISION):
+    """Quantized counterpart of lookup_chunk_embeddings: only codes, scales and norms are loaded.
+
+    Returns a QuantizedVectors whose float32 rows are read from the memory-mapped sidecars on demand,
+    or None if any document is missing, stale or stored at another precision.
+    """
+    stored = {}
+    for filename, texts in chunk_texts_by_doc(chunks).items():
+        entry = load_doc_vectors(filename, store_dir)
+        if entry is None or entry[0] != texts or entry[1] != precision:
+            return None
+        stored[filename] = entry[2:]
+    if not stored:
+        return None
+
+    positions = chunk_positions(chunks, stored)
+    codes = np.stack([stored[filename][0][i] for filename, i in positions])
+    norms = np.array([stored[filename][2][i] for filename, i in positions], dtype=np.float32)
+    scales = None
+    if precision == "int8":
+        scales = np.array([stored[filename][1][i] for filename, i in positions], dtype=np.float32)
+
+    sidecars = {}
+
+    def exact_rows(rows):
+        # Grouped per document so each memory-mapped sidecar is touched once per call
+        out = np.empty((len(rows), codes.shape[1]), dtype=np.float32)
+        by_doc = {}
+        for k, row in enumerate(rows):
+            filename, i = positions[row]
+            by_doc.setdefault(filename, ([], []))
+            by_doc[filename][0].append(k)
+            by_doc[filename][1].append(i)
+        for filename, (targets, local) in by_doc.items():
+            if filename not in sidecars:
+                sidecars[filename] = np.load(vectors_path(filename, store_dir), mmap_mode="r")
+            out[targets] = sidecars[filename][local]
+        return out
+
+    return QuantizedVectors(codes, scales, norms, precision, exact_rows)
@@ -2,10 +2,117 @@ import fitz  # PyMuPDF
 import re
 from statistics import median
 import os
+import json
+import hashlib
+import io
+from concurrent.futures import ProcessPoolExecutor
+
+PAGE_CACHE_ENTRIES = 20000  # cached pages kept; least recently used ones are pruned beyond this
+PRUNE_EVERY = 256           # cache writes between two prunes in a long-lived process
+
+
+def open_pdf(source):
+    """Open a path, bytes/bytearray/memoryview or file-like object as a PyMuPDF document."""
+    if isinstance(source, (str, os.PathLike)):
+        return fitz.open(source)
+    if isinstance(source, io.BytesIO):
+        source = source.getbuffer()  # view of the stream's buffer, no copy
+    elif hasattr(source, "read"):
+        source = source.read()
+    # PyMuPDF reads bytes, bytearray and memoryview buffers in place
+    return fitz.open(stream=source, filetype="pdf")
+
+
+def _decode_page_range(pdf_path, start, stop, cache_dir=None):
+    """Worker entry point: decode pages [start, stop) of a PDF (path or bytes) into span/line records."""
+    page_cache = PageCache(cache_dir) if cache_dir else None
+    extractor = PDFHeadingExtractor(page_cache=page_cache)
+    with open_pdf(pdf_path) as doc:
+        spans, page_lines = extractor.decode_pages(doc, start, stop)
+    cache_stats = (page_cache.hits, page_cache.misses) if page_cache else (0, 0)
+    return spans, page_lines, cache_stats
+
+
+class PageCache:
+    """Decoded span/line records keyed by a hash of the page's content stream and resources.
+
+    Hits refresh an entry's mtime; beyond max_entries the least recently used entries are removed.
+    """
+
+    def __init__(self, cache_dir, max_entries=PAGE_CACHE_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self.prune()
+
+    def page_key(self, page):
+        digest = hashlib.sha1(page.read_contents())
+        # Text drawn inside Form XObjects ("Do") lives in their own streams; nested forms are listed too
+        for xref, name, _, bbox in page.get_xobjects():
+            digest.update(repr((name, tuple(bbox))).encode("utf-8"))
+            digest.update(page.parent.xref_stream(xref) or b"")
+        # xrefs change when a PDF is re-exported, so fonts are identified by name only
+        fonts = sorted((f[1], f[2], f[3], f[4], f[5]) for f in page.get_fonts())
+        digest.update(repr((tuple(page.rect), page.rotation, fonts)).encode("utf-8"))
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
+
+    def get(self, key, page_num):
+        path = self.path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                record = json.load(f)
+            os.utime(path)
+        except FileNotFoundError:
+            # Never cached, or pruned by another process meanwhile
+            self.misses += 1
+            return None
+        self.hits += 1
+        # The same page content can sit at a different page number after an edit
+        spans = [dict(span, page=page_num) for span in record["spans"]]
+        return spans, [tuple(line) for line in record["lines"]]
+
+    def put(self, key, spans, lines):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"spans": spans, "lines": lines}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self.writes += 1
+        if self.writes % PRUNE_EVERY == 0:
+            self.prune()
+
+    def prune(self):
+        entries = []
+        for bucket in os.scandir(self.cache_dir):
+            if not bucket.is_dir():
+                continue
+            for entry in os.scandir(bucket.path):
+                if entry.name.endswith(".json"):
+                    try:
+                        entries.append((entry.stat().st_mtime, entry.path))
+                    except FileNotFoundError:
+                        continue  # pruned by another process meanwhile
+        for _, path in sorted(entries, reverse=True)[self.max_entries:]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
 
 class PDFHeadingExtractor:
-    def __init__(self):
-        pass
+    def __init__(self, page_workers=1, shard_min_pages=200, page_cache=None):
+        # Documents with at least shard_min_pages pages are decoded in page-range shards
+        self.page_workers = page_workers
+        self.shard_min_pages = shard_min_pages
+        # Optional PageCache: unchanged pages of re-exported PDFs are not decoded again
+        self.page_cache = page_cache
 
     def is_decorative(self, text):
         return (
@@ -15,69 +122,124 @@ class PDFHeadingExtractor:
             sum(c.isalpha() for c in text) < 3
         )
 
-    def parse_pdf_spans(self, doc):
+    def parse_page_spans(self, blocks, page_num, page_height):
         all_spans = []
-        for page_num, page in enumerate(doc, start=1):
-            page_height = page.rect.height
-            blocks = page.get_text("dict")["blocks"]
-            for block in blocks:
-                if "lines" not in block:
-                    continue
-                prev_line_text = None
-                for line in block["lines"]:
-                    # Gather all spans in the line
-                    line_spans = []
-                    bold_count = 0
-                    total_count = 0
-                    for span in line["spans"]:
-                        text = span["text"].strip()
-                        if not text or self.is_decorative(text):
-                            continue
-                        y = span["bbox"][1]
-                        x = span["bbox"][0]
-                        if y < 0.05 * page_height or y > 0.95 * page_height:
-                            continue
-                        is_bold = "Bold" in span["font"]
-                        if is_bold:
-                            bold_count += 1
-                        total_count += 1
-                        entry = {
-                            "text": text,
-                            "size": round(span["size"], 1),
-                            "font": span["font"],
-                            "page": page_num,
-                            "is_bold": is_bold,
-                            "y": y,
-                            "x": x
-                        }
-                        line_spans.append(entry)
-                    # Only consider as heading if all spans are bold or only one bold span in the line
-                    if line_spans:
-                        is_single_bold = (bold_count == 1 and total_count == 1)
-                        is_all_bold = (bold_count == total_count)
-                        allow_heading = True
-                        line_text = " ".join(span["text"] for span in line["spans"]).strip() if line["spans"] else ""
-                        # Improved heuristics for headings
-                        if is_all_bold:
-                            # Must be at least 3 words or 15 characters
-                            if len(line_text.split()) < 3 and len(line_text) < 15:
-                                allow_heading = False
-                            # Must start with uppercase
-                            elif line_text and not line_text[0].isupper():
-                                allow_heading = False
-                            # Previous line should not end with hyphen
-                            elif prev_line_text and prev_line_text.strip().endswith("-"):
-                                allow_heading = False
-                        if is_single_bold:
-                            # Check if previous line ends with sentence-ending punctuation
-                            if prev_line_text and prev_line_text.strip()[-1:] in ".:;!?":
-                                allow_heading = False
-                        if (is_all_bold or is_single_bold) and allow_heading:
-                            all_spans.extend(line_spans)
-                    # Update prev_line_text for next iteration
-                    prev_line_text = " ".join(span["text"] for span in line["spans"]).strip() if line["spans"] else None
+        for block in blocks:
+            if "lines" not in block:
+                continue
+            prev_line_text = None
+            for line in block["lines"]:
+                # Gather all spans in the line
+                line_spans = []
+                bold_count = 0
+                total_count = 0
+                for span in line["spans"]:
+                    text = span["text"].strip()
+                    if not text or self.is_decorative(text):
+                        continue
+                    y = span["bbox"][1]
+                    x = span["bbox"][0]
+                    if y < 0.05 * page_height or y > 0.95 * page_height:
+                        continue
+                    is_bold = "Bold" in span["font"]
+                    if is_bold:
+                        bold_count += 1
+                    total_count += 1
+                    entry = {
+                        "text": text,
+                        "size": round(span["size"], 1),
+                        "font": span["font"],
+                        "page": page_num,
+                        "is_bold": is_bold,
+                        "y": y,
+                        "x": x
+                    }
+                    line_spans.append(entry)
+                # Only consider as heading if all spans are bold or only one bold span in the line
+                if line_spans:
+                    is_single_bold = (bold_count == 1 and total_count == 1)
+                    is_all_bold = (bold_count == total_count)
+                    allow_heading = True
+                    line_text = " ".join(span["text"] for span in line["spans"]).strip() if line["spans"] else ""
+                    # Improved heuristics for headings
+                    if is_all_bold:
+                        # Must be at least 3 words or 15 characters
+                        if len(line_text.split()) < 3 and len(line_text) < 15:
+                            allow_heading = False
+                        # Must start with uppercase
+                        elif line_text and not line_text[0].isupper():
+                            allow_heading = False
+                        # Previous line should not end with hyphen
+                        elif prev_line_text and prev_line_text.strip().endswith("-"):
+                            allow_heading = False
+                    if is_single_bold:
+                        # Check if previous line ends with sentence-ending punctuation
+                        if prev_line_text and prev_line_text.strip()[-1:] in ".:;!?":
+                            allow_heading = False
+                    if (is_all_bold or is_single_bold) and allow_heading:
+                        all_spans.extend(line_spans)
+                # Update prev_line_text for next iteration
+                prev_line_text = " ".join(span["text"] for span in line["spans"]).strip() if line["spans"] else None
         return all_spans
 
+    def decode_page(self, page, page_num):
+        """Decode one page into heading-candidate spans and (y, text) line records."""
+        blocks = page.get_text("dict")["blocks"]
+        spans = self.parse_page_spans(blocks, page_num, page.rect.height)
+        lines = []
+        for block in blocks:
+            for line in block.get("lines", []):
+                line_text = " ".join(span["text"] for span in line["spans"]).strip()
+                lines.append((line["bbox"][1], line_text))
+        return spans, lines
+
+    def decode_pages(self, doc, start=0, stop=None):
+        stop = len(doc) if stop is None else stop
+        spans, page_lines = [], []
+        for page_idx in range(start, stop):
+            page = doc[page_idx]
+            cached = None
+            if self.page_cache is not None:
+                key = self.page_cache.page_key(page)
+                cached = self.page_cache.get(key, page_idx + 1)
+            if cached is None:
+                page_spans, lines = self.decode_page(page, page_idx + 1)
+                if self.page_cache is not None:
+                    self.page_cache.put(key, page_spans, lines)
+            else:
+                page_spans, lines = cached
+            spans.extend(page_spans)
+            page_lines.append(lines)
+        return spans, page_lines
+
+    def decode_document(self, doc, pdf_path):
+        """Decode every page, sharding page ranges across processes for large documents."""
+        page_count = len(doc)
+        if self.page_workers <= 1 or page_count < self.shard_min_pages:
+            return self.decode_pages(doc)
+
+        shard_size = max(1, -(-page_count // (self.page_workers * 4)))
+        ranges = [(start, min(start + shard_size, page_count)) for start in range(0, page_count, shard_size)]
+
+        # In-memory documents are shipped to the shard workers as their original bytes
+        if not isinstance(pdf_path, (str, os.PathLike)):
+            stream = getattr(doc, "stream", None)
+            pdf_path = bytes(stream) if stream is not None else doc.tobytes()
+
+        spans, page_lines = [], []
+        with ProcessPoolExecutor(self.page_workers) as pool:
+            cache_dir = self.page_cache.cache_dir if self.page_cache is not None else None
+            futures = [pool.submit(_decode_page_range, pdf_path, start, stop, cache_dir) for start, stop in ranges]
+            # Merge in page order so the global heuristics see the serial span sequence
+            for future in futures:
+                shard_spans, shard_lines, (hits, misses) = future.result()
+                if self.page_cache is not None:
+                    self.page_cache.hits += hits
+                    self.page_cache.misses += misses
+                spans.extend(shard_spans)
+                page_lines.extend(shard_lines)
+        return spans, page_lines
+
     def adjust_font_sizes(self, spans):
         for span in spans:
             adjusted_size = span["size"] + (4 if span["is_bold"] else 0)
@@ -171,85 +333,70 @@ class PDFHeadingExtractor:
 
         return title_parts, outline
 
-    def find_heading_y(self, page, heading_text):
-        """Find the vertical Y-position of the heading on a page."""
-        blocks = page.get_text("dict")["blocks"]
-        for block in blocks:
-            for line in block.get("lines", []):
-                full_line = " ".join(span["text"] for span in line["spans"]).strip()
-                if heading_text in full_line:
-                    return line["bbox"][1]
+    def find_heading_y(self, lines, heading_text):
+        """Find the vertical Y-position of the heading among a page's line records."""
+        for y, full_line in lines:
+            if heading_text in full_line:
+                return y
         return 0
 
-    def extract_section_texts(self, doc, outline):
+    def extract_section_texts(self, page_lines, outline):
         section_texts = {}
         heading_positions = []
 
         # Collect positions for each heading
         for item in outline:
             page_idx = item["page"] - 1
-            y = item.get("y") or self.find_heading_y(doc[page_idx], item["text"])
+            y = item.get("y") or self.find_heading_y(page_lines[page_idx], item["text"])
             heading_positions.append((page_idx, y, item["text"]))
 
         # Extract section text between headings
         for idx, (start_page, start_y, heading_text) in enumerate(heading_positions):
-            end_page, end_y = len(doc) - 1, float('inf')
+            end_page, end_y = len(page_lines) - 1, float('inf')
             if idx + 1 < len(heading_positions):
                 end_page, end_y, _ = heading_positions[idx + 1]
 
             section_lines = []
 
             for p in range(start_page, end_page + 1):
-                page = doc[p]
-                blocks = page.get_text("dict")["blocks"]
-
-                for block in blocks:
-                    if "lines" not in block:
+                for y, line_text in page_lines[p]:
+                    if (p == start_page and y < start_y) or (p == end_page and y >= end_y):
                         continue
-                    for line in block["lines"]:
-                        y = line["bbox"][1]
-                        if (p == start_page and y < start_y) or (p == end_page and y >= end_y):
-                            continue
-                        line_text = " ".join(span["text"] for span in line["spans"]).strip()
-                        if line_text == heading_text:
-                            continue
-                        if line_text:
-                            section_lines.append(line_text)
+                    if line_text == heading_text:
+                        continue
+                    if line_text:
+                        section_lines.append(line_text)
 
             section_texts[idx] = "\n".join(section_lines).strip()
 
         return section_texts
 
-    def extract_toc(self, doc, max_pages=5):
+    def extract_toc(self, page_lines, max_pages=5):
         toc_entries = []
         toc_pattern = re.compile(r"(.+?)\.{2,}\s*(\d+)$")
-        for page_num in range(min(max_pages, len(doc))):
-            page = doc[page_num]
-            blocks = page.get_text("dict")["blocks"]
-            for block in blocks:
-                if "lines" not in block:
-                    continue
-                for line in block["lines"]:
-                    line_text = " ".join(span["text"] for span in line["spans"]).strip()
-                    match = toc_pattern.match(line_text)
-                    if match:
-                        title, page_str = match.groups()
-                        try:
-                            page_number = int(page_str)
-                            toc_entries.append({"title": title.strip(), "page": page_number})
-                        except ValueError:
-                            continue
+        for lines in page_lines[:max_pages]:
+            for _, line_text in lines:
+                match = toc_pattern.match(line_text)
+                if match:
+                    title, page_str = match.groups()
+                    try:
+                        page_number = int(page_str)
+                        toc_entries.append({"title": title.strip(), "page": page_number})
+                    except ValueError:
+                        continue
         return toc_entries
 
-    def extract_structured_headings(self, pdf_path, include_text=False):
-        doc = fitz.open(pdf_path)
-        spans = self.parse_pdf_spans(doc)
+    def extract_structured_headings(self, pdf_path, include_text=False, filename=None):
+        """pdf_path may also be bytes, a memoryview or a file-like stream; filename names it for the title fallback."""
+        doc = open_pdf(pdf_path)
+        # Each page is decoded once; headings and section texts both read these records
+        spans, page_lines = self.decode_document(doc, pdf_path)
         spans = self.adjust_font_sizes(spans)
         base_x, indent_delta, y_merge_threshold = self.infer_dynamic_thresholds(spans)
         size_to_level = self.map_sizes_to_levels(spans)
         title_parts, outline = self.build_outline(spans, size_to_level, base_x, indent_delta, y_merge_threshold)
 
-        toc = self.extract_toc(doc)
+        toc = self.extract_toc(page_lines)
 
         # Use metadata title if no H1 heading found
         title = " ".join(title_parts).strip()
@@ -267,7 +414,9 @@ class PDFHeadingExtractor:
                 title = " ".join(s["text"] for s in largest_spans).strip()
         # If still no title, use filename without extension
         if not title:
-            title = os.path.splitext(os.path.basename(pdf_path))[0]
+            if filename is None and isinstance(pdf_path, (str, os.PathLike)):
+                filename = pdf_path
+            title = os.path.splitext(os.path.basename(filename or ""))[0]
 
         outline = [h for h in outline if h["text"].strip().lower() != title.strip().lower()]
 
@@ -278,10 +427,19 @@ class PDFHeadingExtractor:
         }
 
         if include_text:
-            section_texts = self.extract_section_texts(doc, outline)
+            section_texts = self.extract_section_texts(page_lines, outline)
             for i, item in enumerate(outline):
                 item["text_content"] = section_texts.get(i, "")
 
         for item in result["outline"]:
             item.pop("y", None)
-        return result
\ No newline at end of file
+        return result
+
+    def extract_many(self, documents, include_text=False):
+        """Yield (filename, result, error) for an iterable of (filename, source) pairs, one document at a time."""
+        for filename, source in documents:
+            try:
+                result = self.extract_structured_headings(source, include_text=include_text, filename=filename)
+                yield filename, result, None
+            except Exception as e:
+                yield filename, None, e
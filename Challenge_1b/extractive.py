@@ -0,0 +1,88 @@
+import re
+from collections import OrderedDict
+
+import numpy as np
+
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+")
+MIN_SENTENCE_WORDS = 4
+SENTENCE_CACHE_SIZE = 10000   # sentence embeddings kept per summarizer, least recently used evicted first
+
+
+def split_sentences(text):
+    sentences = [s.strip() for s in SENTENCE_PATTERN.split(text.replace("\n", " "))]
+    return [s for s in sentences if len(s.split()) >= MIN_SENTENCE_WORDS] or [text.strip()]
+
+
+def normalize(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+class ExtractiveSummarizer:
+    """Picks the most relevant sentences of a passage instead of generating text.
+
+    Sentences are scored against the query embedding (and the centroid of the passage's chunk
+    embeddings when given); "centroid" keeps the top scorers, "mmr" trades relevance for diversity.
+    """
+
+    def __init__(self, embedder, query_emb, method="mmr", max_sentences=3, mmr_lambda=0.7,
+                 cache_size=SENTENCE_CACHE_SIZE):
+        self.embedder = embedder
+        self.query = normalize(query_emb)
+        self.method = method
+        self.max_sentences = max_sentences
+        self.mmr_lambda = mmr_lambda
+        # Scoped to this summarizer (one per run), so long-lived workers do not accumulate sentences
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+
+    def prepare(self, texts):
+        # One batched embedding call for every sentence not seen before
+        self.embed_missing([s for text in texts for s in split_sentences(text)])
+
+    def embed_missing(self, sentences):
+        pending = list(dict.fromkeys(s for s in sentences if s not in self.cache))
+        embs = {}
+        if pending:
+            for sentence, emb in zip(pending, self.embedder.embed_documents(pending)):
+                embs[sentence] = self.cache[sentence] = np.asarray(emb, dtype=np.float32)
+                if len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        return embs
+
+    def sentence_embeddings(self, sentences):
+        # A passage's own sentences are never lost to eviction while it is being summarized
+        embs = {s: self.cache[s] for s in sentences if s in self.cache}
+        embs.update(self.embed_missing([s for s in sentences if s not in embs]))
+        for sentence in sentences:
+            if sentence in self.cache:
+                self.cache.move_to_end(sentence)
+        return [embs[s] for s in sentences]
+
+    def select(self, relevance, sentence_embs):
+        k = min(self.max_sentences, len(relevance))
+        if self.method == "centroid":
+            return list(np.argsort(-relevance, kind="stable")[:k])
+
+        selected = []
+        redundancy = np.zeros(len(relevance), dtype=np.float32)
+        available = np.ones(len(relevance), dtype=bool)
+        for _ in range(k):
+            mmr = self.mmr_lambda * relevance - (1.0 - self.mmr_lambda) * redundancy
+            best = int(np.argmax(np.where(available, mmr, -np.inf)))
+            selected.append(best)
+            available[best] = False
+            redundancy = np.maximum(redundancy, sentence_embs @ sentence_embs[best])
+        return selected
+
+    def summarize(self, text, centroid=None):
+        sentences = split_sentences(text)
+        sentence_embs = normalize(self.sentence_embeddings(sentences))
+
+        relevance = sentence_embs @ self.query
+        if centroid is not None:
+            relevance = (relevance + sentence_embs @ normalize(centroid)) / 2
+
+        # Keep the picked sentences in reading order
+        return " ".join(sentences[i] for i in sorted(self.select(relevance, sentence_embs)))
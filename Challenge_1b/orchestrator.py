@@ -0,0 +1,251 @@
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+
+from bm25 import load_or_build
+from config import (
+    EMBEDDING_PATH,
+    JOB_PERFORMER_PATH,
+    COSINE_THRESHOLD,
+    LEXICAL_SCORER,
+    BM25_CANDIDATES,
+    SUMMARY_MODE,
+    ENABLE_HARD_KEYWORD_FILTER,
+    PREFILTER_RECALL_MARGIN,
+    PREFILTER_MIN_KEEP
+)
+from embedding_store import BM25_INDEX_DIR
+from extract_headings import PDFHeadingExtractor
+from pipeline import (
+    chunks_from_outline,
+    load_summarizer,
+    build_summarizer,
+    select_top_sections,
+    build_output,
+    write_output
+)
+from corpus import replace_documents, outline_records
+from embedding_engine import configure_threads
+from process_pdfs import INPUT_DIR, OUTPUT_DIR, INCLUDE_TEXT, CORPUS_PATH
+from scheduler import summarize_top_sections
+from chunk_table import ChunkTable
+from prefilter import cascade_prefilter, print_report
+from score import load_embedder, compute_scores, score_chunk_arrays
+
+INPUT_SPEC = "/app/input/input.json"
+OUTPUT_PATH = "output/output.json"
+
+# Parse processes and embedding threads run at the same time, so the cores are split between them
+EMBED_THREADS = max(1, (os.cpu_count() or 1) // 2)
+PARSE_WORKERS = max(1, (os.cpu_count() or 1) - EMBED_THREADS)
+QUEUE_SIZE = 4         # outlines waiting to be embedded
+EMBED_BATCH = 64       # chunks per embedding call
+
+
+# --- STAGE ACCOUNTING ---
+class StageStats:
+    def __init__(self, name, workers=1):
+        self.name = name
+        self.workers = workers
+        self.busy = 0.0
+        self.idle = 0.0
+        self.items = 0
+
+    async def run(self, loop, executor, fn, *args):
+        start = time.perf_counter()
+        result = await loop.run_in_executor(executor, fn, *args)
+        self.busy += time.perf_counter() - start
+        return result
+
+    async def wait(self, awaitable):
+        start = time.perf_counter()
+        result = await awaitable
+        self.idle += time.perf_counter() - start
+        return result
+
+    def report(self, wall):
+        return {
+            "stage": self.name,
+            "items": self.items,
+            "busy_seconds": round(self.busy, 2),
+            "idle_seconds": round(self.idle, 2),
+            "utilization": round(self.busy / (wall * self.workers), 3) if wall else 0.0
+        }
+
+
+# --- STAGE WORKERS ---
+def parse_pdf(in_path):
+    # Runs in a worker process
+    start = time.perf_counter()
+    result = PDFHeadingExtractor().extract_structured_headings(in_path, include_text=INCLUDE_TEXT)
+    return result, time.perf_counter() - start
+
+
+def load_stage_embedder(model_path):
+    embedder = load_embedder(model_path)
+    # Overrides EMBEDDING_INTRA_OP_THREADS, which assumes embedding has every core to itself
+    configure_threads(intra_op=EMBED_THREADS)
+    return embedder
+
+
+def embed_batch(embedder, texts):
+    return embedder.embed_documents(texts)
+
+
+# --- PIPELINE STAGES ---
+async def parse_stage(loop, pool, documents, outline_queue, stats):
+    results = {}
+
+    async def parse_one(filename):
+        in_path = os.path.join(INPUT_DIR, filename)
+        try:
+            result, duration = await loop.run_in_executor(pool, parse_pdf, in_path)
+        except Exception as e:
+            print(f"Failed: {filename} - {e}")
+            return
+        stats.busy += duration
+        stats.items += 1
+
+        out_path = os.path.join(OUTPUT_DIR, Path(filename).with_suffix('.json').name)
+        with open(out_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=4, ensure_ascii=False)
+        print(f"Processed: {filename}")
+        results[filename] = result
+
+        # Blocks when the embedding stage falls behind
+        await stats.wait(outline_queue.put((filename, result)))
+
+    await asyncio.gather(*(parse_one(doc["filename"]) for doc in documents))
+    await outline_queue.put(None)
+
+    # Keep the binary corpus in step with the outlines for later pipeline.py runs; documents outside
+    # this input.json stay in it
+    if INCLUDE_TEXT:
+        replace_documents(CORPUS_PATH, {doc["filename"]: outline_records(doc["filename"], results[doc["filename"]])
+                                        for doc in documents if doc["filename"] in results})
+
+
+async def embed_stage(loop, executor, embedder_future, outline_queue, stats, embed=True):
+    # embed=False only collects chunks: the cascade prefilter needs the whole corpus before embedding
+    embedder = await embedder_future
+    doc_chunks = {}
+    doc_embs = {}
+
+    while True:
+        item = await stats.wait(outline_queue.get())
+        if item is None:
+            break
+        filename, doc_data = item
+        chunks = chunks_from_outline(filename, doc_data)
+        texts = [c["chunk_text"] for c in chunks]
+
+        embs = []
+        for i in range(0, len(texts) if embed else 0, EMBED_BATCH):
+            embs.extend(await stats.run(loop, executor, embed_batch, embedder, texts[i:i + EMBED_BATCH]))
+        stats.items += len(embs)
+
+        doc_chunks[filename] = chunks
+        doc_embs[filename] = embs
+
+    return embedder, doc_chunks, doc_embs
+
+
+async def run(input_spec=INPUT_SPEC, output_path=OUTPUT_PATH):
+    wall_start = time.perf_counter()
+    with open(input_spec, "r", encoding="utf-8") as f:
+        input_data = json.load(f)
+
+    documents = input_data["documents"]
+    persona = input_data["persona"]["role"]
+    task = input_data["job_to_be_done"]["task"]
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    loop = asyncio.get_running_loop()
+    parse_stats = StageStats("parse", workers=PARSE_WORKERS)
+    embed_stats = StageStats("embed")
+    generate_stats = StageStats("generate")
+
+    with ProcessPoolExecutor(PARSE_WORKERS) as parse_pool, \
+            ThreadPoolExecutor(1, thread_name_prefix="embed") as embed_pool, \
+            ThreadPoolExecutor(1, thread_name_prefix="generate") as generate_pool:
+
+        # Model loading starts immediately and overlaps PDF parsing
+        embedder_future = asyncio.ensure_future(
+            embed_stats.run(loop, embed_pool, load_stage_embedder, EMBEDDING_PATH))
+        summarizer_future = None
+        if SUMMARY_MODE != "extractive":
+            summarizer_future = asyncio.ensure_future(
+                generate_stats.run(loop, generate_pool, load_summarizer, JOB_PERFORMER_PATH))
+
+        outline_queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        _, (embedder, doc_chunks, doc_embs) = await asyncio.gather(
+            parse_stage(loop, parse_pool, documents, outline_queue, parse_stats),
+            embed_stage(loop, embed_pool, embedder_future, outline_queue, embed_stats,
+                        embed=not ENABLE_HARD_KEYWORD_FILTER)
+        )
+
+        # Keep the same chunk order as pipeline.load_section_chunks
+        chunks, chunk_embs = [], []
+        for doc in documents:
+            chunks.extend(doc_chunks.get(doc["filename"], []))
+            chunk_embs.extend(doc_embs.get(doc["filename"], []))
+        if not chunks:
+            print("❌ No chunks extracted. Exiting.")
+            return None
+
+        chunk_texts = [c["chunk_text"] for c in chunks]
+        table = ChunkTable(chunks)
+        bm25_index = load_or_build(chunk_texts, BM25_INDEX_DIR) if LEXICAL_SCORER == "bm25" else None
+        if ENABLE_HARD_KEYWORD_FILTER:
+            # Same cascade path as pipeline.run: embed only the chunks that survive the prefilter
+            titles = [c["section_title"] for c in chunks]
+            rows, prefilter_report = cascade_prefilter(task, chunk_texts, titles, bm25_index=bm25_index,
+                                                       recall_margin=PREFILTER_RECALL_MARGIN,
+                                                       min_keep=PREFILTER_MIN_KEEP)
+            scores, query_emb, chunk_embs = await embed_stats.run(
+                loop, embed_pool, partial(score_chunk_arrays, query=task, chunks=chunk_texts, model_path=EMBEDDING_PATH,
+                                          bm25_index=bm25_index, bm25_candidates=BM25_CANDIDATES, rows=rows,
+                                          return_embeddings=True))
+            embed_stats.items += len(rows)
+        else:
+            query_emb = await embed_stats.run(loop, embed_pool, embedder.embed_query, task)
+            chunk_embs = np.asarray(chunk_embs, dtype=np.float32)
+            scores = compute_scores(task, chunk_texts, query_emb, chunk_embs, bm25_index, BM25_CANDIDATES)
+        retained = table.set_scores(scores, threshold=COSINE_THRESHOLD)
+        if ENABLE_HARD_KEYWORD_FILTER:
+            print_report(prefilter_report, retained)
+        table.set_embeddings(chunk_embs)
+        top_sections = select_top_sections(table)
+
+        # The generation stage sits idle from model load until sections are selected
+        ready = time.perf_counter()
+        summarizer = await summarizer_future if summarizer_future else build_summarizer(query_emb)
+        generate_stats.idle = max(0.0, ready - wall_start - generate_stats.busy)
+        subsection_analysis, summary_status = await generate_stats.run(
+            loop, generate_pool, summarize_top_sections, summarizer, top_sections, persona, task
+        )
+        generate_stats.items = len(subsection_analysis)
+
+    write_output(build_output(documents, persona, task, top_sections, subsection_analysis, summary_status), output_path)
+
+    wall = time.perf_counter() - wall_start
+    report = [stats.report(wall) for stats in (parse_stats, embed_stats, generate_stats)]
+    print(f"⏱️ Orchestrated run finished in {wall:.2f} seconds.")
+    for row in report:
+        print(f"   {row['stage']:<9} busy {row['busy_seconds']:>7.2f}s  idle {row['idle_seconds']:>7.2f}s  "
+              f"utilization {row['utilization']:.0%}  ({row['items']} items)")
+    return report
+
+
+def main():
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
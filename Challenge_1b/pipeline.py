@@ -2,11 +2,9 @@ import json
 import os
 import time
 import warnings
-from collections import defaultdict
 from datetime import datetime
-from statistics import mean
+from functools import lru_cache
 
-from tqdm import tqdm
 from transformers import pipeline, AutoTokenizer, AutoModelForSeq2SeqLM
 
 from config import (
@@ -14,10 +12,27 @@ from config import (
     JOB_PERFORMER_PATH,
     COSINE_THRESHOLD,
     DROP_RATIO,
-    MAX_SECTIONS
+    MAX_SECTIONS,
+    SUMMARY_TOKEN_BUDGET,
+    SUMMARY_TIME_BUDGET,
+    LEXICAL_SCORER,
+    BM25_CANDIDATES,
+    ENABLE_HARD_KEYWORD_FILTER,
+    PREFILTER_RECALL_MARGIN,
+    PREFILTER_MIN_KEEP,
+    VECTOR_PRECISION,
+    SUMMARY_MODE,
+    EXTRACTIVE_METHOD,
+    EXTRACTIVE_SENTENCES
 )
-from score import score_chunks  
-from summary import extract_insights
+from bm25 import load_or_build
+from corpus import Corpus
+from extractive import ExtractiveSummarizer
+from embedding_store import lookup_chunk_embeddings, lookup_chunk_vectors, EMBEDDING_DIR, BM25_INDEX_DIR
+from chunk_table import ChunkTable
+from prefilter import cascade_prefilter, print_report
+from score import load_embedder, score_chunk_arrays
+from scheduler import summarize_top_sections
 
 
 # Suppress future warnings (like from PyTorch)
@@ -35,38 +50,71 @@ def split_into_chunks(text, max_tokens=500):
 
 
 # --- LOAD + CHUNK SECTIONS ---
+def chunks_from_outline(filename, doc_data, max_tokens=500):
+    chunk_list = []
+    for section in doc_data.get("outline", []):
+        section_text = section.get('text_content', "")
+        if not section_text:
+            continue  # Skip sections without text content
+
+        chunk_texts = split_into_chunks(section_text, max_tokens=max_tokens)
+        for idx, chunk_text in enumerate(chunk_texts):
+            chunk_list.append({
+                'document': filename,
+                'section_title': section['text'],
+                'page_number': section.get('page', 1),
+                'chunk_text': chunk_text
+            })
+    return chunk_list
+
+
+def load_outline_chunks(filename, outline_dir, max_tokens=500):
+    outline_path = os.path.join(outline_dir, filename.replace('.pdf', '.json'))
+    if not os.path.exists(outline_path):
+        print(f"⚠️ Warning: Outline not found for {filename}")
+        return []
+
+    with open(outline_path, 'r', encoding='utf-8') as f:
+        doc_data = json.load(f)
+    return chunks_from_outline(filename, doc_data, max_tokens=max_tokens)
+
+
+def load_corpus_chunks(documents, corpus_path, outline_dir="outlines", max_tokens=500):
+    chunk_list = []
+    with Corpus(corpus_path) as corpus:
+        for doc in documents:
+            filename = doc['filename']
+            rows = corpus.document_rows(filename)
+            if not rows:
+                # Not in the corpus (e.g. written by another run); its outline JSON may still be there
+                chunk_list.extend(load_outline_chunks(filename, outline_dir, max_tokens=max_tokens))
+                continue
+
+            outline = [{
+                "text": corpus.string("section_title", i),
+                "page": int(corpus.pages[i]),
+                "text_content": corpus.string("text", i)
+            } for i in rows]
+            chunk_list.extend(chunks_from_outline(filename, {"outline": outline}, max_tokens=max_tokens))
+
+    return chunk_list
+
+
 def load_section_chunks(documents, outline_dir="outlines", max_tokens=500):
+    # Prefer the binary corpus written by process_pdfs.py over per-PDF JSON files
+    corpus_path = os.path.join(outline_dir, "corpus.bin")
+    if os.path.exists(corpus_path):
+        return load_corpus_chunks(documents, corpus_path, outline_dir=outline_dir, max_tokens=max_tokens)
+
     chunk_list = []
     for doc in documents:
-        filename = doc['filename']
-        outline_path = os.path.join(outline_dir, filename.replace('.pdf', '.json'))
-
-        if not os.path.exists(outline_path):
-            print(f"⚠️ Warning: Outline not found for {filename}")
-            continue
-
-        with open(outline_path, 'r', encoding='utf-8') as f:
-            doc_data = json.load(f)
-
-        for section in doc_data.get("outline", []):
-            section_text = section.get('text_content', "")
-            if not section_text:
-                continue  # Skip sections without text content
-
-            chunk_texts = split_into_chunks(section_text, max_tokens=max_tokens)
-            for idx, chunk_text in enumerate(chunk_texts):
-                chunk_list.append({
-                    'document': filename,
-                    'section_title': section['text'],
-                    'page_number': section.get('page', 1),
-                    'chunk_text': chunk_text
-                })
-
+        chunk_list.extend(load_outline_chunks(doc['filename'], outline_dir, max_tokens=max_tokens))
     return chunk_list
 
 
 # --- Summarization Model Loading and Wrapper ---
 
+@lru_cache(maxsize=None)
 def load_summarizer(local_path):
     tokenizer = AutoTokenizer.from_pretrained(local_path, local_files_only=True)
     model = AutoModelForSeq2SeqLM.from_pretrained(local_path, local_files_only=True)
@@ -75,10 +123,60 @@ def load_summarizer(local_path):
 
 
 
+# --- SECTION RANKING ---
+def select_top_sections(table):
+    # Steps 5-7: Group retained chunks by (document, section_title), average their scores
+    # and cut the ranking at the first large score gap
+    return table.top_sections(DROP_RATIO, MAX_SECTIONS)
+
+
+# --- OUTPUT ---
+def build_summarizer(query_emb):
+    # Extractive mode reuses the already loaded embedding model and never loads flan-t5
+    if SUMMARY_MODE == "extractive":
+        return ExtractiveSummarizer(load_embedder(EMBEDDING_PATH), query_emb,
+                                    method=EXTRACTIVE_METHOD, max_sentences=EXTRACTIVE_SENTENCES)
+    return load_summarizer(JOB_PERFORMER_PATH)
+
+
+def build_output(documents, persona, task, top_sections, subsection_analysis, summary_status=None):
+    output = {
+        "metadata": {
+            "input_documents": [doc["filename"] for doc in documents],
+            "persona": persona,
+            "job_to_be_done": task,
+            "processing_timestamp": datetime.now().isoformat()
+        },
+        "extracted_sections": [
+            {
+                "document": section["document"],
+                "section_title": section["section_title"],
+                "importance_rank": section["importance_rank"],
+                "page_number": section["page_number"]
+            } for section in top_sections
+        ],
+        "subsection_analysis": subsection_analysis
+    }
+
+    if summary_status is not None and (SUMMARY_TOKEN_BUDGET is not None or SUMMARY_TIME_BUDGET is not None):
+        output["metadata"]["summary_status"] = summary_status
+
+    return output
+
+
+def write_output(output, output_path="output/output.json"):
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(output, f, indent=2, ensure_ascii=False)
+
+    print(f"✅ Final output written to: {output_path}")
+
+
 # --- MAIN PIPELINE ---
-def main():
+def run(input_path="/app/input/input.json", output_path="output/output.json", outline_dir="outlines",
+        store_dir=EMBEDDING_DIR):
     # Step 1: Load input spec
-    with open("/app/input/input.json", "r", encoding="utf-8") as f:
+    with open(input_path, "r", encoding="utf-8") as f:
         input_data = json.load(f)
 
     documents = input_data["documents"]
@@ -86,136 +184,74 @@ def main():
     task = input_data["job_to_be_done"]["task"]
 
     # Step 2: Chunk sections
-    chunks = load_section_chunks(documents)
+    chunks = load_section_chunks(documents, outline_dir=outline_dir)
     if not chunks:
         print("❌ No chunks extracted. Exiting.")
-        return
+        return None
 
     print(f"✅ Loaded {len(chunks)} chunks across {len(documents)} documents.\n")
 
     # Step 3: Prepare input for scoring
     chunk_texts = [c["chunk_text"] for c in chunks]
+    # Reuse embeddings kept up to date by watch.py when they match the current outlines;
+    # compressed stores load only codes and norms, float32 rows are read back for re-scoring
+    chunk_embs = None
+    if VECTOR_PRECISION != "float32":
+        chunk_embs = lookup_chunk_vectors(chunks, store_dir, precision=VECTOR_PRECISION)
+    if chunk_embs is None:
+        # Entries saved at another precision (e.g. before the setting changed) are still reused
+        chunk_embs = lookup_chunk_embeddings(chunks, store_dir)
+    # The BM25 index is saved next to the embeddings and rebuilt only when the chunks change
+    bm25_index = load_or_build(chunk_texts, BM25_INDEX_DIR) if LEXICAL_SCORER == "bm25" else None
+
+    # Cascade mode: drop clearly irrelevant chunks before they reach the embedding model
+    # (pointless when every chunk already has a stored embedding; it would only cost recall)
+    rows = None
+    if ENABLE_HARD_KEYWORD_FILTER and chunk_embs is None:
+        titles = [c["section_title"] for c in chunks]
+        rows, prefilter_report = cascade_prefilter(task, chunk_texts, titles, bm25_index=bm25_index,
+                                                   recall_margin=PREFILTER_RECALL_MARGIN, min_keep=PREFILTER_MIN_KEEP)
 
     # Start timing for scoring/ranking
     start_rank_time = time.time()
-    scored_output = score_chunks(query=task, chunks=chunk_texts, model_path=EMBEDDING_PATH, threshold=COSINE_THRESHOLD)
+    scores, query_emb, chunk_embs = score_chunk_arrays(
+        query=task, chunks=chunk_texts, model_path=EMBEDDING_PATH, chunk_embs=chunk_embs,
+        bm25_index=bm25_index, bm25_candidates=BM25_CANDIDATES, rows=rows, return_embeddings=True
+    )
     end_rank_time = time.time()
     # print(f"⏱️ Ranking (embedding + scoring) completed in {end_rank_time - start_rank_time:.2f} seconds.\n")
 
-    # Step 4: Map scores back to metadata
-    scored_chunks = []
-    scored_text_map = {score[0]: score for score in scored_output}
-
-    for c in tqdm(chunks, desc="Mapping scores to chunks"):
-        text = c["chunk_text"]
-        if text in scored_text_map:
-            score_data = scored_text_map[text]
-            c.update({
-                "score": score_data[1],  # final_score
-                "cosine_similarity": score_data[2],
-                "keyword_score": score_data[4]
-            })
-            scored_chunks.append(c)
-
-    print(f"✅ Retained {len(scored_chunks)} scored chunks after filtering threshold.\n")
-
-    # Step 5: Group by (document, section_title)
-    sections = defaultdict(lambda: {
-        'document': '',
-        'section_title': '',
-        'page_number': 0,
-        'scores': [],
-        'chunks': []
-    })
-
-    for c in tqdm(scored_chunks, desc="Grouping chunks into sections"):
-        key = (c['document'], c['section_title'])
-        s = sections[key]
-        s['document'] = c['document']
-        s['section_title'] = c['section_title']
-        s['page_number'] = c['page_number']
-        s['chunks'].append(c)
-        s['scores'].append(c['score'])
-
-    # Step 6: Average scores per section
-    for s in sections.values():
-        s["avg_score"] = mean(s["scores"]) if s["scores"] else 0.0
-
-    # Step 7: Dynamic selection of top sections based on score gaps
-    sorted_sections = sorted(sections.values(), key=lambda x: x["avg_score"], reverse=True)
-    avg_scores = [s["avg_score"] for s in sorted_sections]
-
-    if avg_scores:
-        max_score = avg_scores[0]
-        threshold = DROP_RATIO * max_score
-
-        cutoff_idx = len(avg_scores)  # default to all if no big drop
-        for i in range(len(avg_scores) - 1):
-            diff = avg_scores[i] - avg_scores[i + 1]
-            if diff > threshold:
-                cutoff_idx = i + 1
-                break
-
-        cutoff_idx = min(cutoff_idx, MAX_SECTIONS)
-        top_sections = sorted_sections[:cutoff_idx]
-    else:
-        top_sections = []
-
-    # Assign importance rank
-    for i, section in enumerate(top_sections, 1):
-        section["importance_rank"] = i
-
-    # Load summarizer model once
-    summarizer = load_summarizer(JOB_PERFORMER_PATH)
-
-    # Step 8: Extract insights from chunks of selected sections
-    subsection_analysis = []
+    # Step 4: Scores live in a columnar table indexed by chunk position, so duplicate texts never collide
+    table = ChunkTable(chunks)
+    retained = table.set_scores(scores, threshold=COSINE_THRESHOLD)
+    table.set_embeddings(chunk_embs)
+    print(f"✅ Retained {retained} scored chunks after filtering threshold.\n")
+    if rows is not None:
+        print_report(prefilter_report, retained)
+
+    # Steps 5-7: Group, average and select the top sections
+    top_sections = select_top_sections(table)
+
+    # Load summarizer model once (or wrap the embedder in extractive mode)
+    summarizer = build_summarizer(query_emb)
 
+    # Step 8: Extract insights from chunks of selected sections, within the summary budget
     # Start timing for insights extraction
     start_analysis_time = time.time()
 
-    for section in tqdm(top_sections, desc="Extracting insights from top sections"):
-        for chunk in section["chunks"]:
-            refined = extract_insights(
-                summarizer=summarizer,
-                persona=persona,
-                task=task,
-                paragraph=chunk["chunk_text"]
-            )
-            subsection_analysis.append({
-                "document": section["document"],
-                "section_title": section["section_title"],
-                "refined_text": refined.strip(),
-                "page_number": section["page_number"]
-            })
+    subsection_analysis, summary_status = summarize_top_sections(summarizer, top_sections, persona, task)
 
     end_analysis_time = time.time()
     
 
     # Step 9: Write output
-    output = {
-        "metadata": {
-            "input_documents": [doc["filename"] for doc in documents],
-            "persona": persona,
-            "job_to_be_done": task,
-            "processing_timestamp": datetime.now().isoformat()
-        },
-        "extracted_sections": [
-            {
-                "document": section["document"],
-                "section_title": section["section_title"],
-                "importance_rank": section["importance_rank"],
-                "page_number": section["page_number"]
-            } for section in top_sections
-        ],
-        "subsection_analysis": subsection_analysis
-    }
+    output = build_output(documents, persona, task, top_sections, subsection_analysis, summary_status)
+    write_output(output, output_path)
+    return output
 
-    os.makedirs("output", exist_ok=True)
-    with open("output/output.json", "w", encoding="utf-8") as f:
-        json.dump(output, f, indent=2, ensure_ascii=False)
 
-    print("✅ Final output written to: output/output.json")
+def main():
+    run()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,67 @@
+import math
+
+import numpy as np
+
+from bm25 import tokenize
+from score import extract_keywords_from_query, keyword_score
+
+
+# --- CASCADE PREFILTER ---
+def stem_score(text, stems):
+    # Looser than keyword_score: counts keyword prefixes anywhere in the text ("plan" also hits "planning")
+    text = text.lower()
+    return sum(1 for stem in stems if stem in text) / max(len(stems), 1)
+
+
+def cascade_prefilter(query, chunks, titles, bm25_index=None, recall_margin=0.1, min_keep=50):
+    """Pick the chunk rows worth embedding; returns (rows, report).
+
+    Stage 1 keeps chunks whose text matches a query keyword (BM25 postings when an index is given).
+    Stage 2 rescues chunks whose section title matches a keyword.
+    Stage 3 tops the set up to max(min_keep, recall_margin * len(chunks)) using keyword-prefix matches,
+    so a query phrased differently from the documents still reaches the embedding stage.
+    """
+    n = len(chunks)
+    keywords = extract_keywords_from_query(query)
+
+    if bm25_index is not None:
+        hit_rows, _ = bm25_index.search(tokenize(" ".join(keywords)))
+        lexical = np.zeros(n, dtype=bool)
+        lexical[hit_rows] = True
+    else:
+        lexical = np.array([keyword_score(chunk, keywords) > 0 for chunk in chunks], dtype=bool)
+
+    title_hits = {}
+    for title in set(titles):
+        title_hits[title] = keyword_score(title, keywords) > 0
+    title_match = np.array([title_hits[title] for title in titles], dtype=bool)
+    keep = lexical | title_match
+
+    target = min(n, max(min_keep, math.ceil(recall_margin * n)))
+    margin_added = 0
+    if keep.sum() < target:
+        stems = {kw[:5] for kw in keywords if len(kw) >= 3}
+        rest = np.flatnonzero(~keep)
+        soft = np.array([stem_score(chunks[i], stems) + stem_score(titles[i], stems) for i in rest])
+        extra = rest[np.argsort(-soft, kind="stable")[:target - int(keep.sum())]]
+        keep[extra] = True
+        margin_added = len(extra)
+
+    rows = np.flatnonzero(keep)
+    report = {
+        "chunks": n,
+        "lexical_kept": int(lexical.sum()),
+        "title_rescued": int((title_match & ~lexical).sum()),
+        "margin_added": margin_added,
+        "removed_before_embedding": n - len(rows),
+        "embedded": len(rows)
+    }
+    return rows, report
+
+
+def print_report(report, retained):
+    print("🧹 Cascade prefilter:")
+    print(f"   {report['chunks']} chunks in, {report['lexical_kept']} lexical hits, "
+          f"+{report['title_rescued']} by section title, +{report['margin_added']} recall margin")
+    print(f"   lexical/title stage removed {report['removed_before_embedding']}, "
+          f"cosine stage removed {report['embedded'] - retained}, {retained} retained")
@@ -1,19 +1,27 @@
 import os
 import time
 from pathlib import Path
-from extract_headings import PDFHeadingExtractor
+from extract_headings import PDFHeadingExtractor, PageCache
+from corpus import write_corpus, outline_records
 import json
 
 INPUT_DIR = "/app/input/PDFs"
 OUTPUT_DIR = "/app/outlines"
 INCLUDE_TEXT = True  # better to use boolean, not string
+PAGE_WORKERS = os.cpu_count() or 1  # processes used to decode page ranges of large PDFs
+SHARD_MIN_PAGES = 200  # PDFs shorter than this are decoded serially
+CORPUS_PATH = os.path.join(OUTPUT_DIR, "corpus.bin")  # binary columnar copy of all section texts
+PAGE_CACHE_DIR = os.path.join(OUTPUT_DIR, ".page_cache")  # decoded pages keyed by content hash (None disables)
+WRITE_OUTLINE_JSON = True  # per-PDF outline JSON files (the corpus alone is enough for pipeline.py)
 
 
 def main():
-    extractor = PDFHeadingExtractor()
     os.makedirs(OUTPUT_DIR, exist_ok=True)
+    extractor = PDFHeadingExtractor(page_workers=PAGE_WORKERS, shard_min_pages=SHARD_MIN_PAGES,
+                                    page_cache=PageCache(PAGE_CACHE_DIR) if PAGE_CACHE_DIR else None)
 
     start_time_total = time.time()  # Start total timer
+    records = []
 
     for filename in os.listdir(INPUT_DIR):
         if filename.lower().endswith(".pdf"):
@@ -26,14 +34,21 @@ def main():
 
                 duration = time.time() - start_time  # Elapsed time for this document
 
-                with open(out_path, 'w', encoding='utf-8') as f:
-                    json.dump(result, f, indent=4, ensure_ascii=False)
+                records.extend(outline_records(filename, result))
+                if WRITE_OUTLINE_JSON:
+                    with open(out_path, 'w', encoding='utf-8') as f:
+                        json.dump(result, f, indent=4, ensure_ascii=False)
 
                 print(f"Processed: {filename}")
             except Exception as e:
                 print(f"Failed: {filename} - {e}")
 
+    if INCLUDE_TEXT:
+        write_corpus(CORPUS_PATH, records)
+
     total_duration = time.time() - start_time_total
+    if extractor.page_cache is not None:
+        print(f"Page cache: {extractor.page_cache.hits} pages reused, {extractor.page_cache.misses} decoded")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,179 @@
+import time
+
+from tqdm import tqdm
+
+from config import SUMMARY_TOKEN_BUDGET, SUMMARY_TIME_BUDGET, LOW_VALUE_RATIO, PACK_PROMPTS, PACK_MAX_INPUT_TOKENS
+from extractive import ExtractiveSummarizer
+from summary import extract_insights, build_prompt, PASSAGE_SEPARATOR
+
+
+# --- BUDGET PLANNING ---
+def chunk_cost(chunk):
+    # Cost of a chunk in the same whitespace "tokens" used by split_into_chunks
+    return len(chunk["chunk_text"].split())
+
+
+def make_job(section, chunks, text, merged, trimmed=False):
+    # Chunk embeddings ride along so the extractive summarizer never re-embeds a chunk
+    embeddings = [c["embedding"] for c in chunks if c.get("embedding") is not None]
+    return {"section": section, "text": text, "chunks": len(chunks), "merged": merged, "trimmed": trimmed,
+            "embeddings": embeddings}
+
+
+def plan_summaries(top_sections, token_budget=None, low_value_ratio=0.5):
+    """Turn the selected sections into an ordered list of summarization jobs."""
+    jobs = []
+    skipped = 0
+
+    if token_budget is None:
+        for section in top_sections:
+            for chunk in section["chunks"]:
+                jobs.append(make_job(section, [chunk], chunk["chunk_text"], False))
+        return jobs, skipped
+
+    # Higher ranked sections get a bigger share of the budget
+    weights = [1.0 / section["importance_rank"] for section in top_sections]
+    total_weight = sum(weights) or 1.0
+    carry = 0.0
+
+    for section, weight in zip(top_sections, weights):
+        share = token_budget * weight / total_weight + carry
+        best = max(c["score"] for c in section["chunks"])
+
+        core, low_value = [], []
+        for chunk in sorted(section["chunks"], key=lambda c: c["score"], reverse=True):
+            if chunk["score"] >= low_value_ratio * best:
+                core.append(chunk)
+            else:
+                low_value.append(chunk)
+
+        # Best chunks first; the first one that does not fit is trimmed to what is left of the share
+        selected = []
+        core_covered = True
+        for chunk in core:
+            cost = chunk_cost(chunk)
+            if cost <= share:
+                selected.append((chunk, chunk["chunk_text"], False))
+                share -= cost
+            elif core_covered and share >= 1:
+                words = chunk["chunk_text"].split()
+                selected.append((chunk, " ".join(words[:int(share)]), True))
+                share -= int(share)
+                core_covered = False
+            else:
+                skipped += 1
+                core_covered = False
+
+        # Keep reading order inside the section
+        order = {id(c): i for i, c in enumerate(section["chunks"])}
+        selected.sort(key=lambda entry: order[id(entry[0])])
+        for chunk, text, trimmed in selected:
+            jobs.append(make_job(section, [chunk], text, False, trimmed))
+
+        # Low-value chunks only get what is left once every core chunk is in, merged into one trimmed passage
+        if low_value and core_covered and share >= 1:
+            low_value.sort(key=lambda c: order[id(c)])
+            words = " ".join(c["chunk_text"] for c in low_value).split()
+            jobs.append(make_job(section, low_value, " ".join(words[:int(share)]), True, len(words) > int(share)))
+            share -= min(len(words), int(share))
+        else:
+            skipped += len(low_value)
+
+        carry = share
+
+    return jobs, skipped
+
+
+# --- PROMPT PACKING ---
+def pack_jobs(jobs, tokenizer, persona, task, max_input_tokens=None):
+    """Merge adjacent jobs of the same section into one prompt while it fits the model's input limit."""
+    if not jobs:
+        return jobs
+    limit = max_input_tokens or tokenizer.model_max_length
+    # The persona/objective preamble is paid once per prompt; passages are measured on their own
+    overhead = len(tokenizer(build_prompt(persona, task, ""))["input_ids"])
+    separator = len(tokenizer(PASSAGE_SEPARATOR, add_special_tokens=False)["input_ids"])
+    lengths = [len(ids) for ids in tokenizer([job["text"] for job in jobs], add_special_tokens=False)["input_ids"]]
+
+    packed = []
+    used = 0
+    for job, length in zip(jobs, lengths):
+        last = packed[-1] if packed else None
+        if last is not None and last["section"] is job["section"] and used + separator + length <= limit:
+            last["text"] += PASSAGE_SEPARATOR + job["text"]
+            last["chunks"] += job["chunks"]
+            last["merged"] = last["merged"] or job["merged"]
+            last["trimmed"] = last["trimmed"] or job["trimmed"]
+            last["embeddings"] = last["embeddings"] + job["embeddings"]
+            last["packed"] += 1
+            used += separator + length
+        else:
+            packed.append(dict(job, packed=1))
+            used = overhead + length
+    return packed
+
+
+# --- BUDGETED EXECUTION ---
+def run_summaries(summarizer, jobs, persona, task, time_budget=None):
+    """Summarize jobs in order, stopping before a call would overrun the deadline."""
+    subsection_analysis = []
+    start = time.time()
+    deadline = start + time_budget if time_budget is not None else None
+    completed = 0
+
+    extractive = isinstance(summarizer, ExtractiveSummarizer)
+    if extractive:
+        summarizer.prepare([job["text"] for job in jobs])
+
+    for job in tqdm(jobs, desc="Extracting insights from top sections"):
+        if deadline is not None:
+            now = time.time()
+            avg_call = (now - start) / completed if completed else 0.0
+            if now + avg_call > deadline:
+                break
+
+        if extractive:
+            centroid = sum(job["embeddings"]) / len(job["embeddings"]) if job["embeddings"] else None
+            refined = summarizer.summarize(job["text"], centroid=centroid)
+        else:
+            refined = extract_insights(
+                summarizer=summarizer,
+                persona=persona,
+                task=task,
+                paragraph=job["text"]
+            )
+        section = job["section"]
+        subsection_analysis.append({
+            "document": section["document"],
+            "section_title": section["section_title"],
+            "refined_text": refined.strip(),
+            "page_number": section["page_number"]
+        })
+        completed += 1
+
+    status = {
+        "completed_jobs": completed,
+        "pending_jobs": len(jobs) - completed,
+        "merged_jobs": sum(1 for job in jobs[:completed] if job["merged"]),
+        "packed_passages": sum(job.get("packed", 1) for job in jobs[:completed]),
+        "elapsed_seconds": round(time.time() - start, 2),
+        "partial": completed < len(jobs)
+    }
+    return subsection_analysis, status
+
+
+def summarize_top_sections(summarizer, top_sections, persona, task):
+    jobs, skipped_chunks = plan_summaries(top_sections, token_budget=SUMMARY_TOKEN_BUDGET, low_value_ratio=LOW_VALUE_RATIO)
+    if PACK_PROMPTS and not isinstance(summarizer, ExtractiveSummarizer):
+        prompts = len(jobs)
+        jobs = pack_jobs(jobs, summarizer.tokenizer, persona, task, max_input_tokens=PACK_MAX_INPUT_TOKENS)
+        print(f"📦 Packed {prompts} passages into {len(jobs)} generate calls.")
+    subsection_analysis, status = run_summaries(summarizer, jobs, persona, task, time_budget=SUMMARY_TIME_BUDGET)
+
+    status["skipped_chunks"] = skipped_chunks
+    status["trimmed_jobs"] = sum(1 for job in jobs if job["trimmed"])
+    status["partial"] = status["partial"] or skipped_chunks > 0 or status["trimmed_jobs"] > 0
+    if status["partial"]:
+        print(f"⚠️ Summary budget reached: {status['pending_jobs']} jobs pending, {skipped_chunks} chunks skipped.")
+
+    return subsection_analysis, status
@@ -1,12 +1,18 @@
 import re
-import time
+from functools import lru_cache
+
 import nltk
+import numpy as np
 from langchain_huggingface import HuggingFaceEmbeddings
 from sklearn.metrics.pairwise import cosine_similarity
 from nltk.corpus import stopwords
 from nltk.tokenize import word_tokenize
 from nltk import pos_tag
 
+from bm25 import tokenize
+from config import EMBEDDING_ENGINE, EMBEDDING_INTRA_OP_THREADS, EMBEDDING_INTER_OP_THREADS, COSINE_THRESHOLD
+from vector_store import QuantizedVectors, SubsetVectors, print_vector_report
+
 
 ###########################
 # Ensure NLTK resources
@@ -98,9 +104,13 @@ def extract_keywords_from_query(query):
         return raw_keywords
 
 
-def soft_scale(score, low=0.50, high=0.75):
-    # Scales score linearly between low and high to [0,1], clamps to [0,1]
-    return max(0.0, min(1.0, (score - low) / (high - low)))
+SOFT_SCALE_LOW = 0.50
+SOFT_SCALE_HIGH = 0.75
+
+
+def soft_scale(score, low=SOFT_SCALE_LOW, high=SOFT_SCALE_HIGH):
+    # Scales score (a number or an array) linearly between low and high to [0,1], clamps to [0,1]
+    return np.clip((np.asarray(score, dtype=np.float64) - low) / (high - low), 0.0, 1.0)
 
 
 def keyword_score(text, dynamic_keywords):
@@ -110,29 +120,80 @@ def keyword_score(text, dynamic_keywords):
     return hits / max(len(dynamic_keywords), 1)
 
 
-def score_chunks(query, chunks, model_path, threshold):
-    embeddings = HuggingFaceEmbeddings(model_name=model_path)
-    query_emb = embeddings.embed_query(query)
-    chunk_embs = embeddings.embed_documents(chunks)
-    cosine_scores = cosine_similarity([query_emb], chunk_embs)[0]
+@lru_cache(maxsize=None)
+def load_embedder(model_path):
+    if EMBEDDING_ENGINE == "bucketed":
+        from embedding_engine import EmbeddingEngine
+        return EmbeddingEngine(model_path, intra_op_threads=EMBEDDING_INTRA_OP_THREADS,
+                               inter_op_threads=EMBEDDING_INTER_OP_THREADS)
+    return HuggingFaceEmbeddings(model_name=model_path)
 
-    dynamic_keywords = extract_keywords_from_query(query)
-    print(f"\n🔍 Extracted Keywords: {sorted(dynamic_keywords)}\n")
 
-    ranked_chunks = []
+def compute_scores(query, chunks, query_emb, chunk_embs, bm25_index=None, bm25_candidates=None, rows=None,
+                   cosine_scores=None):
+    # One array per score, aligned with chunks, no threshold applied
+    # cosine_scores: precomputed from stored reduced-precision vectors, exact wherever the threshold can be reached
+    if cosine_scores is None:
+        cosine_scores = np.asarray(cosine_similarity([query_emb], chunk_embs)[0], dtype=np.float64)
 
-    for chunk, cosine in zip(chunks, cosine_scores):
-        start_time = time.time()
-
-        kw_score = keyword_score(chunk, dynamic_keywords)
-        scaled_cosine = soft_scale(cosine)
-
-        if cosine < threshold:
-            continue
-
-        final_score = 0.6 * scaled_cosine + 0.4 * kw_score
-        elapsed_time = time.time() - start_time
+    dynamic_keywords = extract_keywords_from_query(query)
+    print(f"\n🔍 Extracted Keywords: {sorted(dynamic_keywords)}\n")
 
-        ranked_chunks.append((chunk, final_score, cosine, scaled_cosine, kw_score, elapsed_time))
+    if bm25_index is not None:
+        # Hybrid mode: BM25 over the inverted index replaces the keyword hit ratio;
+        # only the top bm25_candidates chunks get a non-zero lexical score
+        query_terms = tokenize(" ".join(dynamic_keywords))
+        kw_scores = bm25_index.normalized_scores(query_terms, k=bm25_candidates)
+        if rows is not None:
+            kw_scores = kw_scores[rows]  # the index covers every chunk, scores are for the subset
+    else:
+        kw_scores = np.array([keyword_score(chunk, dynamic_keywords) for chunk in chunks], dtype=np.float64)
+    scaled_cosine = soft_scale(cosine_scores)
+
+    return {
+        "score": 0.6 * scaled_cosine + 0.4 * kw_scores,
+        "cosine_similarity": cosine_scores,
+        "scaled_cosine": scaled_cosine,
+        "keyword_score": kw_scores
+    }
+
+
+def score_chunk_arrays(query, chunks, model_path, chunk_embs=None, bm25_index=None, bm25_candidates=None, rows=None,
+                       return_embeddings=False):
+    # rows: optional subset of chunk positions to embed and score (cascade prefilter); the rest score 0
+    # chunk_embs: float32 matrix, or QuantizedVectors from the store (scored compressed, re-scored exactly)
+    embeddings = load_embedder(model_path)
+    query_emb = embeddings.embed_query(query)
 
-    return sorted(ranked_chunks, key=lambda x: x[1], reverse=True)
+    cosine_scores = None
+    if isinstance(chunk_embs, QuantizedVectors):
+        # Every chunk already has a stored vector, so a prefilter would save nothing
+        rows = None
+        cosine_scores, report = chunk_embs.cosine(query_emb, COSINE_THRESHOLD)
+        print_vector_report(report)
+
+    subset = chunks if rows is None else [chunks[i] for i in rows]
+    if chunk_embs is None:
+        chunk_embs = embeddings.embed_documents(subset)
+        if hasattr(embeddings, "report"):
+            embeddings.report()
+    elif rows is not None:
+        chunk_embs = np.asarray(chunk_embs)[rows]
+
+    if rows is None:
+        scores = compute_scores(query, chunks, query_emb, chunk_embs, bm25_index, bm25_candidates,
+                                cosine_scores=cosine_scores)
+        vectors = chunk_embs if cosine_scores is not None else np.asarray(chunk_embs, dtype=np.float32)
+    else:
+        subset_scores = compute_scores(query, subset, query_emb, chunk_embs, bm25_index, bm25_candidates, rows=rows)
+        scores = {}
+        for name, column in subset_scores.items():
+            scores[name] = np.zeros(len(chunks), dtype=np.float64)
+            scores[name][rows] = column
+        # Only the embedded rows are kept; filtered chunks have no vector
+        vectors = SubsetVectors(np.asarray(chunk_embs, dtype=np.float32), rows)
+
+    if return_embeddings:
+        # Later stages (extractive summaries) reuse these instead of re-embedding chunks
+        return scores, np.asarray(query_emb, dtype=np.float32), vectors
+    return scores
@@ -0,0 +1,338 @@
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from config import EMBEDDING_PATH
+from corpus import write_corpus, outline_records
+from embedding_store import EMBEDDING_DIR, save_doc_embeddings, store_files
+from extract_headings import PDFHeadingExtractor, PageCache
+from pipeline import chunks_from_outline, run
+from process_pdfs import INPUT_DIR, OUTPUT_DIR, INCLUDE_TEXT, PAGE_WORKERS, SHARD_MIN_PAGES, PAGE_CACHE_DIR
+from score import load_embedder
+from watch import save_json
+
+SHARED_DIR = "/app/shared"     # directory every node mounts (NFS/EFS/...)
+SHARD_COUNT = 8                # shards in a new manifest; more shards than nodes evens out stragglers
+LEASE_SECONDS = 600.0          # a claimed shard is given up for lost after this long without renewal
+IDLE_POLL = 10.0               # seconds a worker waits for leased shards to finish or expire
+
+# Layout under SHARED_DIR:
+#   manifest.json                   shard id -> PDF filenames, plus the size/mtime of every input PDF
+#   locks/<shard>.lock              lease held by the worker processing the shard
+#   partials/<shard>/               finished shard: outlines/*.json, embeddings/*.npz (+ *.f32.npy), done.json
+#   partials/<shard>.<worker>.tmp/  shard being written; renamed into place when complete
+
+
+# --- MANIFEST ---
+def manifest_path(shared_dir):
+    return os.path.join(shared_dir, "manifest.json")
+
+
+def input_signatures(input_dir):
+    # Size and mtime of every PDF; a manifest only applies to the input set it was built from
+    signatures = {}
+    for filename in sorted(f for f in os.listdir(input_dir) if f.lower().endswith(".pdf")):
+        stat = os.stat(os.path.join(input_dir, filename))
+        signatures[filename] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    return signatures
+
+
+def check_inputs(manifest, shared_dir=SHARED_DIR):
+    """Refuse to reuse shards built from another input set (PDFs added, removed or changed since)."""
+    current = input_signatures(manifest["input_dir"])
+    recorded = manifest.get("inputs", {})
+    if current != recorded:
+        changed = sorted(f for f in set(current) | set(recorded) if current.get(f) != recorded.get(f))
+        raise RuntimeError(f"Input PDFs changed since {manifest_path(shared_dir)} was created "
+                           f"({len(changed)} files, e.g. {changed[0]}); "
+                           f"run 'python shard_runner.py reset' to start a new run")
+
+
+def create_manifest(shared_dir=SHARED_DIR, input_dir=INPUT_DIR, shard_count=SHARD_COUNT):
+    """Split the PDFs into shards of similar total size; an existing manifest is kept if the PDFs are unchanged."""
+    path = manifest_path(shared_dir)
+    if os.path.exists(path):
+        manifest = load_manifest(shared_dir)
+        check_inputs(manifest, shared_dir)
+        return manifest
+
+    inputs = input_signatures(input_dir)
+    files = list(inputs)
+    sizes = {f: inputs[f]["size"] for f in files}
+    shard_count = max(1, min(shard_count, len(files)))
+
+    # Largest files first, each to the currently lightest shard
+    shards = [{"id": f"shard-{i:03d}", "files": [], "bytes": 0} for i in range(shard_count)]
+    for filename in sorted(files, key=lambda f: (-sizes[f], f)):
+        shard = min(shards, key=lambda s: (s["bytes"], s["id"]))
+        shard["files"].append(filename)
+        shard["bytes"] += sizes[filename]
+    for shard in shards:
+        shard["files"].sort()
+
+    manifest = {"input_dir": input_dir, "created_at": time.time(), "inputs": inputs, "shards": shards}
+    os.makedirs(shared_dir, exist_ok=True)
+    save_json(manifest, path)
+    return manifest
+
+
+def reset(shared_dir=SHARED_DIR):
+    # Drops the manifest, leases and finished shards so the next manifest/local run starts over
+    if os.path.exists(manifest_path(shared_dir)):
+        os.remove(manifest_path(shared_dir))
+    for name in ("locks", "partials"):
+        shutil.rmtree(os.path.join(shared_dir, name), ignore_errors=True)
+
+
+def load_manifest(shared_dir=SHARED_DIR):
+    with open(manifest_path(shared_dir), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def shard_dir(shared_dir, shard_id):
+    return os.path.join(shared_dir, "partials", shard_id)
+
+
+def is_done(shared_dir, shard_id):
+    return os.path.exists(os.path.join(shard_dir(shared_dir, shard_id), "done.json"))
+
+
+# --- LEASES ---
+def lock_path(shared_dir, shard_id):
+    return os.path.join(shared_dir, "locks", f"{shard_id}.lock")
+
+
+def read_lease(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # Missing, or caught mid-write by its owner
+        return None
+
+
+def try_claim(shared_dir, shard_id, worker_id, lease_seconds=LEASE_SECONDS):
+    """Take the shard's lease with an exclusive create; expired leases are broken first."""
+    path = lock_path(shared_dir, shard_id)
+    lease = {"shard": shard_id, "worker": worker_id, "expires": time.time() + lease_seconds}
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        current = read_lease(path)
+        try:
+            # A lock left empty by a worker that died right after creating it expires by mtime
+            expires = current["expires"] if current else os.path.getmtime(path) + lease_seconds
+        except FileNotFoundError:
+            return False
+        if expires > time.time():
+            return False
+        # Only one of the workers racing for an expired lease wins the rename
+        stale = f"{path}.{worker_id}.stale"
+        try:
+            os.rename(path, stale)
+        except FileNotFoundError:
+            return False
+        if read_lease(stale) != current:
+            # Lost the race: what we moved is a fresh lease taken in the meantime. Put it back with
+            # link, which fails if a third worker has created a new lock since, instead of replacing it
+            try:
+                os.link(stale, path)
+            except FileExistsError:
+                pass
+            os.remove(stale)
+            return False
+        os.remove(stale)
+        return try_claim(shared_dir, shard_id, worker_id, lease_seconds)
+
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(lease, f)
+    return True
+
+
+def renew(shared_dir, shard_id, worker_id, lease_seconds=LEASE_SECONDS):
+    # Returns False if the lease expired and another worker took the shard over
+    path = lock_path(shared_dir, shard_id)
+    current = read_lease(path)
+    if current is None or current["worker"] != worker_id:
+        return False
+    save_json({"shard": shard_id, "worker": worker_id, "expires": time.time() + lease_seconds}, path)
+    return True
+
+
+def release(shared_dir, shard_id, worker_id):
+    path = lock_path(shared_dir, shard_id)
+    current = read_lease(path)
+    if current is not None and current["worker"] == worker_id:
+        os.remove(path)
+
+
+# --- WORKER ---
+def process_shard(shared_dir, shard, worker_id, input_dir, extractor, embedder, lease_seconds=LEASE_SECONDS):
+    """Extract and embed one shard into a private temp dir, then publish it with a single rename."""
+    tmp_dir = f"{shard_dir(shared_dir, shard['id'])}.{worker_id}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(os.path.join(tmp_dir, "outlines"))
+
+    start = time.time()
+    done = {"shard": shard["id"], "worker": worker_id, "documents": [], "failed": [], "chunks": 0}
+    for filename in shard["files"]:
+        try:
+            result = extractor.extract_structured_headings(os.path.join(input_dir, filename), include_text=INCLUDE_TEXT)
+        except Exception as e:
+            print(f"Failed: {filename} - {e}")
+            done["failed"].append(filename)
+            continue
+
+        with open(os.path.join(tmp_dir, "outlines", Path(filename).with_suffix('.json').name), 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=4, ensure_ascii=False)
+
+        chunks = chunks_from_outline(filename, result)
+        if chunks:
+            embeddings = embedder.embed_documents([c["chunk_text"] for c in chunks])
+            save_doc_embeddings(filename, chunks, embeddings, store_dir=os.path.join(tmp_dir, "embeddings"))
+        done["documents"].append(filename)
+        done["chunks"] += len(chunks)
+        print(f"Processed: {filename} ({shard['id']}, {len(chunks)} chunks)")
+
+        if not renew(shared_dir, shard["id"], worker_id, lease_seconds):
+            print(f"⚠️ Lost the lease on {shard['id']}, another worker took it over.")
+
+    done["seconds"] = round(time.time() - start, 2)
+    save_json(done, os.path.join(tmp_dir, "done.json"))
+    try:
+        os.rename(tmp_dir, shard_dir(shared_dir, shard["id"]))
+    except OSError:
+        # Another worker published the same shard first; its results are identical
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return done
+
+
+def run_worker(shared_dir=SHARED_DIR, worker_id=None, lease_seconds=LEASE_SECONDS):
+    """Claim and process shards until every shard in the manifest is done."""
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    manifest = load_manifest(shared_dir)
+    check_inputs(manifest, shared_dir)
+    os.makedirs(os.path.join(shared_dir, "locks"), exist_ok=True)
+    os.makedirs(os.path.join(shared_dir, "partials"), exist_ok=True)
+
+    extractor = PDFHeadingExtractor(page_workers=PAGE_WORKERS, shard_min_pages=SHARD_MIN_PAGES,
+                                    page_cache=PageCache(PAGE_CACHE_DIR) if PAGE_CACHE_DIR else None)
+    embedder = load_embedder(EMBEDDING_PATH)
+
+    processed = 0
+    while True:
+        pending = [s for s in manifest["shards"] if not is_done(shared_dir, s["id"])]
+        if not pending:
+            break
+        claimed = None
+        for shard in pending:
+            if try_claim(shared_dir, shard["id"], worker_id, lease_seconds):
+                claimed = shard
+                break
+        if claimed is None:
+            # Everything left is leased by other workers; wait in case one of them dies
+            time.sleep(IDLE_POLL)
+            continue
+
+        try:
+            if not is_done(shared_dir, claimed["id"]):
+                process_shard(shared_dir, claimed, worker_id, manifest["input_dir"], extractor, embedder, lease_seconds)
+                processed += 1
+        finally:
+            release(shared_dir, claimed["id"], worker_id)
+
+    print(f"👷 Worker {worker_id} finished: {processed} shards processed.")
+    return processed
+
+
+# --- MERGE ---
+def shard_status(shared_dir=SHARED_DIR):
+    manifest = load_manifest(shared_dir)
+    status = {"shards": len(manifest["shards"]), "done": 0, "leased": 0, "pending": 0}
+    for shard in manifest["shards"]:
+        if is_done(shared_dir, shard["id"]):
+            status["done"] += 1
+        elif read_lease(lock_path(shared_dir, shard["id"])) is not None:
+            status["leased"] += 1
+        else:
+            status["pending"] += 1
+    return status
+
+
+def merge(shared_dir=SHARED_DIR, outline_dir=OUTPUT_DIR, embedding_dir=EMBEDDING_DIR,
+          input_path=None, output_path="output/output.json"):
+    """Combine finished shards into the outline dir, corpus and embedding store, then optionally run the pipeline."""
+    check_inputs(load_manifest(shared_dir), shared_dir)
+    status = shard_status(shared_dir)
+    if status["done"] < status["shards"]:
+        raise RuntimeError(f"{status['shards'] - status['done']} of {status['shards']} shards are not finished")
+
+    os.makedirs(outline_dir, exist_ok=True)
+    os.makedirs(embedding_dir, exist_ok=True)
+    records = []
+    failed = []
+    for shard in load_manifest(shared_dir)["shards"]:
+        src = shard_dir(shared_dir, shard["id"])
+        with open(os.path.join(src, "done.json"), 'r', encoding='utf-8') as f:
+            failed.extend(json.load(f)["failed"])
+
+        for filename in shard["files"]:
+            outline_file = os.path.join(src, "outlines", Path(filename).with_suffix('.json').name)
+            if not os.path.exists(outline_file):
+                continue
+            with open(outline_file, 'r', encoding='utf-8') as f:
+                records.extend(outline_records(filename, json.load(f)))
+            shutil.copyfile(outline_file, os.path.join(outline_dir, os.path.basename(outline_file)))
+
+            # Float32 sidecar before the .npz, so a visible .npz always has its full-precision rows
+            for embedding_file in reversed(store_files(filename, os.path.join(src, "embeddings"))):
+                shutil.copyfile(embedding_file, os.path.join(embedding_dir, os.path.basename(embedding_file)))
+
+    if INCLUDE_TEXT:
+        write_corpus(os.path.join(outline_dir, "corpus.bin"), records)
+    print(f"🧩 Merged {status['shards']} shards: {len(records)} sections, {len(failed)} failed PDFs.")
+
+    # The pipeline finds every chunk embedding in the store and only embeds the query
+    if input_path is not None:
+        return run(input_path=input_path, output_path=output_path, outline_dir=outline_dir, store_dir=embedding_dir)
+    return None
+
+
+# --- LOCAL TEST MODE ---
+def run_local(workers, shared_dir=SHARED_DIR):
+    # Separate processes stand in for nodes; they only share the directory
+    create_manifest(shared_dir)
+    procs = [subprocess.Popen([sys.executable, __file__, "worker", f"local-{i}", shared_dir]) for i in range(workers)]
+    return [p.wait() for p in procs]
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "worker"
+    if command == "manifest":
+        manifest = create_manifest()
+        print(f"📋 {len(manifest['shards'])} shards in {manifest_path(SHARED_DIR)}")
+    elif command == "worker":
+        worker_id = sys.argv[2] if len(sys.argv) > 2 else None
+        shared_dir = sys.argv[3] if len(sys.argv) > 3 else SHARED_DIR
+        run_worker(shared_dir, worker_id)
+    elif command == "reset":
+        reset()
+        print(f"🧹 Removed the manifest, leases and finished shards under {SHARED_DIR}")
+    elif command == "status":
+        print(shard_status())
+    elif command == "merge":
+        merge(input_path=sys.argv[2] if len(sys.argv) > 2 else "/app/input/input.json")
+    elif command == "local":
+        run_local(int(sys.argv[2]) if len(sys.argv) > 2 else 2)
+        merge(input_path="/app/input/input.json")
+    else:
+        print("Usage: shard_runner.py [manifest | worker [id] [shared_dir] | status | merge [input.json] | local [workers] | reset]")
+
+
+if __name__ == "__main__":
+    main()
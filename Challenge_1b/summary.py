@@ -1,5 +1,8 @@
-def extract_insights(summarizer, persona, task, paragraph, max_tokens=512):
-    prompt = (
+PASSAGE_SEPARATOR = "\n\n"
+
+
+def build_prompt(persona, task, paragraph):
+    return (
         f"Role: {persona}\n"
         f"Objective: {task}\n\n"
         "Use the following passage as background context. Generate a concise summary (max 100 words) "
@@ -8,6 +11,10 @@ def extract_insights(summarizer, persona, task, paragraph, max_tokens=512):
         f"Given Context Passage:\n{paragraph}\n\n"
         "Summary:"
     )
+
+
+def extract_insights(summarizer, persona, task, paragraph, max_tokens=512):
+    prompt = build_prompt(persona, task, paragraph)
     result = summarizer(
         prompt,
         max_new_tokens=max_tokens,
@@ -0,0 +1,39 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus import Corpus, write_corpus, replace_documents
+
+
+def records(filename, count):
+    return [{"document": filename, "section_title": f"{filename} section {i}", "page_number": i + 1,
+             "text": f"text {i} of {filename}"} for i in range(count)]
+
+
+def test_replace_documents_keeps_other_documents(tmp_path):
+    path = str(tmp_path / "corpus.bin")
+    write_corpus(path, records("a.pdf", 2) + records("b.pdf", 3))
+    replace_documents(path, {"a.pdf": None, "c.pdf": records("c.pdf", 1)})
+
+    with Corpus(path) as corpus:
+        assert [corpus.row(i) for i in range(len(corpus))] == records("b.pdf", 3) + records("c.pdf", 1)
+        assert corpus.embeddings is None
+    assert os.listdir(tmp_path) == ["corpus.bin"]
+
+
+def test_replace_documents_carries_embeddings(tmp_path):
+    path = str(tmp_path / "corpus.bin")
+    vectors = np.arange(20, dtype=np.float32).reshape(5, 4)
+    write_corpus(path, records("a.pdf", 2) + records("b.pdf", 3), vectors)
+
+    with pytest.raises(ValueError):
+        replace_documents(path, {"c.pdf": records("c.pdf", 1)})
+    replace_documents(path, {"a.pdf": records("a.pdf", 1)}, embeddings={"a.pdf": np.ones((1, 4))})
+
+    with Corpus(path) as corpus:
+        assert list(corpus.document_rows("b.pdf")) == [0, 1, 2]
+        assert np.array_equal(corpus.embeddings, np.vstack([vectors[2:], np.ones((1, 4))]))
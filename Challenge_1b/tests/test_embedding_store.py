@@ -0,0 +1,45 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_store import (
+    save_doc_embeddings,
+    load_doc_embeddings,
+    load_doc_vectors,
+    lookup_chunk_embeddings,
+    lookup_chunk_vectors
+)
+
+
+def doc_chunks(filename, count):
+    return [{"document": filename, "chunk_text": f"{filename} chunk {i}"} for i in range(count)]
+
+
+def test_round_trip_every_precision(tmp_path):
+    rng = np.random.default_rng(0)
+    chunks = doc_chunks("a.pdf", 5) + doc_chunks("b.pdf", 3)
+    vectors = rng.normal(size=(len(chunks), 16)).astype(np.float32)
+    for precision in ("float32", "float16", "int8"):
+        store = str(tmp_path / precision)
+        save_doc_embeddings("a.pdf", chunks[:5], vectors[:5], store_dir=store, precision=precision)
+        save_doc_embeddings("b.pdf", chunks[5:], vectors[5:], store_dir=store, precision=precision)
+
+        assert np.array_equal(lookup_chunk_embeddings(chunks, store), vectors)
+        if precision != "float32":
+            stored = lookup_chunk_vectors(chunks, store, precision)
+            assert len(stored) == len(chunks)
+            assert np.array_equal(stored[6], vectors[6])
+
+
+def test_round_trip_zero_chunks(tmp_path):
+    for precision in ("float32", "float16", "int8"):
+        store = str(tmp_path / precision)
+        save_doc_embeddings("blank.pdf", [], [], store_dir=store, precision=precision)
+
+        texts, embeddings = load_doc_embeddings("blank.pdf", store)
+        assert texts == [] and len(embeddings) == 0
+        if precision != "float32":
+            assert load_doc_vectors("blank.pdf", store)[0] == []
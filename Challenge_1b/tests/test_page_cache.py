@@ -0,0 +1,51 @@
+import os
+import sys
+
+import fitz
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extract_headings import PDFHeadingExtractor, PageCache
+
+
+def form_xobject_pdf(path, word, nested=False):
+    # The visible text only lives in a Form XObject; the page's own content stream is just "/fzFrm0 Do"
+    src = fitz.open()
+    page = src.new_page()
+    page.insert_text((72, 100), f"A Guide To {word}", fontsize=24, fontname="hebo")
+    page.insert_text((72, 150), f"Growing {word} At Home", fontsize=16, fontname="hebo")
+    for i in range(5):
+        page.insert_text((72, 180 + 16 * i), f"Line {i} of body text about {word.lower()}.", fontsize=11)
+    if nested:
+        inner, src = src, fitz.open()
+        src.new_page().show_pdf_page(src[0].rect, inner, 0)
+    out = fitz.open()
+    out.new_page().show_pdf_page(out[0].rect, src, 0)
+    out.save(path)
+
+
+def test_form_xobject_edit_misses_cache(tmp_path):
+    for nested in (False, True):
+        first, second = tmp_path / f"apples{nested}.pdf", tmp_path / f"oranges{nested}.pdf"
+        form_xobject_pdf(str(first), "Apples", nested)
+        form_xobject_pdf(str(second), "Oranges", nested)
+
+        cached = PDFHeadingExtractor(page_cache=PageCache(str(tmp_path / f"cache{nested}")))
+        cached.extract_structured_headings(str(first), include_text=True)
+        warm = cached.extract_structured_headings(str(second), include_text=True)
+        fresh = PDFHeadingExtractor().extract_structured_headings(str(second), include_text=True)
+
+        assert "Oranges" in fresh["title"]
+        assert warm == fresh
+
+
+def test_least_recently_used_pages_are_pruned(tmp_path):
+    cache = PageCache(str(tmp_path / "cache"), max_entries=2)
+    for age, key in enumerate(("aa01", "bb02", "cc03")):
+        cache.put(key, [], [])
+        os.utime(cache.path(key), (1000 + age, 1000 + age))
+    assert cache.get("aa01", 1) == ([], [])  # refreshes the oldest entry
+
+    cache.prune()
+    assert cache.get("bb02", 1) is None
+    assert cache.get("aa01", 1) is not None and cache.get("cc03", 1) is not None
@@ -0,0 +1,123 @@
+import numpy as np
+
+PRECISIONS = ("float32", "float16", "int8")
+RANK_REPORT_TOP = 10   # report whether the approximate and exact top-N orders agree
+BLOCK_ROWS = 4096      # rows widened to float32 at a time in the first pass
+SLACK = 1e-6           # float32 arithmetic error of the first pass itself
+
+
+def quantize(embeddings, precision):
+    """Compress float32 vectors; returns (codes, scales, norms), scales is None unless int8.
+
+    int8 is per-row symmetric scalar quantization: codes * scale ≈ vector.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown vector precision: {precision}")
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.maximum(np.linalg.norm(embeddings, axis=1), 1e-12).astype(np.float32)
+    if precision == "int8":
+        scales = (np.maximum(np.abs(embeddings).max(axis=1, initial=0.0), 1e-12) / 127.0).astype(np.float32)
+        return np.rint(embeddings / scales[:, None]).astype(np.int8), scales, norms
+    return embeddings.astype(np.float16 if precision == "float16" else np.float32), None, norms
+
+
+class QuantizedVectors:
+    """Compressed chunk vectors for a first scoring pass; float32 rows are read back only for re-scoring.
+
+    exact_rows(rows) returns the float32 vectors of the given row positions (from disk). Each row keeps its
+    exact norm and a bound on the cosine error, so the rows that can reach the threshold are known.
+    """
+
+    def __init__(self, codes, scales, norms, precision, exact_rows):
+        self.codes = codes
+        self.scales = scales
+        self.norms = norms
+        self.precision = precision
+        self.exact_rows = exact_rows
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        # Full-precision vector of one chunk (used for the selected sections only)
+        return self.exact_rows(np.array([i]))[0]
+
+    def memory(self):
+        stored = self.codes.nbytes + self.norms.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+        full = self.codes.shape[0] * self.codes.shape[1] * 4
+        return {"float32_bytes": full, "stored_bytes": stored, "saved_bytes": full - stored}
+
+    def approximate_cosine(self, query_emb):
+        query = np.asarray(query_emb, dtype=np.float32)
+        query_norm = max(float(np.linalg.norm(query)), 1e-12)
+        dots = np.empty(len(self), dtype=np.float32)
+        magnitudes = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), BLOCK_ROWS):
+            block = self.codes[start:start + BLOCK_ROWS].astype(np.float32)
+            dots[start:start + BLOCK_ROWS] = block @ query
+            magnitudes[start:start + BLOCK_ROWS] = np.abs(block) @ np.abs(query)
+
+        if self.scales is not None:
+            dots *= self.scales
+            # Rounding error is at most scale / 2 per component
+            bound = 0.5 * self.scales * float(np.abs(query).sum())
+        else:
+            # Relative float16 rounding error per component; float32 is the exact reference
+            eps = 2.0 ** -11 * 1.01 if self.precision == "float16" else 0.0
+            bound = eps * magnitudes
+        scale = self.norms * query_norm
+        return dots / scale, bound / scale
+
+    def cosine(self, query_emb, threshold):
+        """Cosine per row: exact for every row that can reach the threshold, approximate elsewhere."""
+        approx, bound = self.approximate_cosine(query_emb)
+        candidates = np.flatnonzero(approx + bound + SLACK >= threshold)
+
+        # Same float64 arithmetic as sklearn's cosine_similarity on the full-precision path
+        query = np.asarray(query_emb, dtype=np.float64)
+        rows = np.asarray(self.exact_rows(candidates), dtype=np.float64).reshape(len(candidates), -1)
+        exact = rows @ query / np.maximum(np.linalg.norm(rows, axis=1) * np.linalg.norm(query), 1e-12)
+
+        cosine = approx.astype(np.float64)
+        cosine[candidates] = exact
+        return cosine, self.rank_report(approx, cosine, candidates, threshold)
+
+    def rank_report(self, approx, cosine, candidates, threshold):
+        # How the approximate pass alone would have differed from the re-scored result
+        approx_kept = np.flatnonzero(approx >= threshold)
+        exact_kept = np.flatnonzero(cosine >= threshold)
+        approx_order = approx_kept[np.argsort(-approx[approx_kept], kind="stable")]
+        exact_order = exact_kept[np.argsort(-cosine[exact_kept], kind="stable")]
+        shared = min(len(approx_order), len(exact_order))
+        return {
+            "precision": self.precision,
+            **self.memory(),
+            "rows": len(self),
+            "rescored": len(candidates),
+            "threshold_flips": len(np.setxor1d(approx_kept, exact_kept)),
+            "rank_changes": int((approx_order[:shared] != exact_order[:shared]).sum()),
+            "top_order_same": bool(np.array_equal(approx_order[:RANK_REPORT_TOP], exact_order[:RANK_REPORT_TOP]))
+        }
+
+
+class SubsetVectors:
+    """Vectors of a subset of chunk positions, indexed by chunk position (None outside the subset)."""
+
+    def __init__(self, matrix, rows):
+        self.matrix = matrix
+        self.rows = np.asarray(rows)
+
+    def __getitem__(self, i):
+        pos = int(np.searchsorted(self.rows, i))
+        if pos < len(self.rows) and self.rows[pos] == i:
+            return self.matrix[pos]
+        return None
+
+
+def print_vector_report(report):
+    print(f"🗜️ {report['precision']} vectors: {report['stored_bytes'] / 2**20:.1f} MB loaded instead of "
+          f"{report['float32_bytes'] / 2**20:.1f} MB ({report['saved_bytes'] / 2**20:.1f} MB saved), "
+          f"{report['rescored']}/{report['rows']} rows re-scored exactly from disk")
+    print(f"   approximate-only ranking would differ: {report['threshold_flips']} threshold flips, "
+          f"{report['rank_changes']} retained rows out of place, "
+          f"top {RANK_REPORT_TOP} {'identical' if report['top_order_same'] else 'different'}")
@@ -0,0 +1,147 @@
+import json
+import os
+import time
+from pathlib import Path
+
+from config import EMBEDDING_PATH
+from corpus import replace_documents, outline_records
+from embedding_store import EMBEDDING_DIR, save_doc_embeddings, remove_doc_embeddings
+from extract_headings import PDFHeadingExtractor, PageCache
+from pipeline import chunks_from_outline
+from process_pdfs import INPUT_DIR, OUTPUT_DIR, INCLUDE_TEXT, PAGE_WORKERS, SHARD_MIN_PAGES, CORPUS_PATH, PAGE_CACHE_DIR
+from score import load_embedder
+
+POLL_INTERVAL = 5.0    # seconds between directory scans
+SETTLE_SECONDS = 2.0   # ignore files modified more recently than this (still being copied)
+STATE_PATH = os.path.join(OUTPUT_DIR, ".watch_state.json")
+STATUS_PATH = os.path.join(OUTPUT_DIR, ".watch_status.json")
+
+
+# --- STATE ---
+def load_state(path=STATE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_json(data, path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def scan_inputs(input_dir=INPUT_DIR):
+    # Signature (mtime_ns, size) of every PDF in the input folder, and of the settled ones only
+    now = time.time()
+    seen, signatures = {}, {}
+    for entry in os.scandir(input_dir):
+        if not entry.is_file() or not entry.name.lower().endswith(".pdf"):
+            continue
+        stat = entry.stat()
+        seen[entry.name] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+        if now - stat.st_mtime >= SETTLE_SECONDS:
+            signatures[entry.name] = seen[entry.name]
+    return seen, signatures
+
+
+def outline_path(filename):
+    return os.path.join(OUTPUT_DIR, Path(filename).with_suffix('.json').name)
+
+
+# --- INCREMENTAL INGEST ---
+def ingest(filename, extractor, embedder, corpus_updates):
+    in_path = os.path.join(INPUT_DIR, filename)
+    result = extractor.extract_structured_headings(in_path, include_text=INCLUDE_TEXT)
+    chunks = chunks_from_outline(filename, result)
+    embeddings = embedder.embed_documents([c["chunk_text"] for c in chunks]) if chunks else []
+    save_doc_embeddings(filename, chunks, embeddings)
+
+    # Outline and corpus rows change only once the embeddings are stored, so a failure leaves the old version whole
+    with open(outline_path(filename), 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=4, ensure_ascii=False)
+    corpus_updates[filename] = outline_records(filename, result)
+    return len(chunks)
+
+
+def remove(filename, corpus_updates):
+    if os.path.exists(outline_path(filename)):
+        os.remove(outline_path(filename))
+    corpus_updates[filename] = None
+    remove_doc_embeddings(filename)
+
+
+def poll_once(state, extractor, embedder, status):
+    seen, signatures = scan_inputs()
+    known = {name for name in os.listdir(INPUT_DIR) if name.lower().endswith(".pdf")}
+    # Corpus changes from the whole poll are applied with a single rewrite
+    corpus_updates = {}
+
+    for filename in [name for name in state if name not in known]:
+        remove(filename, corpus_updates)
+        del state[filename]
+        status["removed"] += 1
+        print(f"Removed: {filename}")
+
+    # Arrival time is when a new name or a new version is first seen; a moved-in file keeps its old mtime
+    now = time.time()
+    for filename, sig in seen.items():
+        entry = state.setdefault(filename, {})
+        if entry.get("signature") != sig:
+            entry.setdefault("first_seen", now)
+
+    # Files that failed before are retried only once their signature changes
+    changed = [name for name, sig in signatures.items()
+               if state[name].get("signature") != sig]
+    status["pending"] = len(changed)
+
+    for filename in sorted(changed, key=lambda name: signatures[name]["mtime_ns"]):
+        entry = state[filename]
+        try:
+            chunk_count = ingest(filename, extractor, embedder, corpus_updates)
+        except Exception as e:
+            print(f"Failed: {filename} - {e}")
+            entry.pop("first_seen", None)
+            entry.update({"signature": signatures[filename], "error": str(e), "failed_at": time.time()})
+            status["failed"] += 1
+            status["pending"] -= 1
+            continue
+
+        # Ingest lag: time from the file landing in the folder to its embeddings being stored
+        lag = time.time() - entry["first_seen"]
+        state[filename] = {"signature": signatures[filename], "chunks": chunk_count, "ingested_at": time.time()}
+        status["ingested"] += 1
+        status["pending"] -= 1
+        status["last_lag_seconds"] = round(lag, 2)
+        status["max_lag_seconds"] = round(max(status["max_lag_seconds"], lag), 2)
+        print(f"Processed: {filename} ({chunk_count} chunks, lag {lag:.2f}s)")
+
+    replace_documents(CORPUS_PATH, corpus_updates)
+    status["documents"] = sum(1 for entry in state.values() if "chunks" in entry)
+    status["updated_at"] = time.time()
+    save_json(state, STATE_PATH)
+    save_json(status, STATUS_PATH)
+    return changed
+
+
+def main():
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    os.makedirs(EMBEDDING_DIR, exist_ok=True)
+    extractor = PDFHeadingExtractor(page_workers=PAGE_WORKERS, shard_min_pages=SHARD_MIN_PAGES,
+                                    page_cache=PageCache(PAGE_CACHE_DIR) if PAGE_CACHE_DIR else None)
+    embedder = load_embedder(EMBEDDING_PATH)
+
+    state = load_state()
+    status = {"documents": sum(1 for entry in state.values() if "chunks" in entry),
+              "pending": 0, "ingested": 0, "failed": 0, "removed": 0,
+              "last_lag_seconds": 0.0, "max_lag_seconds": 0.0, "updated_at": None}
+
+    print(f"👀 Watching {INPUT_DIR} every {POLL_INTERVAL:.0f}s (status: {STATUS_PATH})")
+    while True:
+        poll_once(state, extractor, embedder, status)
+        time.sleep(POLL_INTERVAL)
+
+
+if __name__ == "__main__":
+    main()
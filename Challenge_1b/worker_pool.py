@@ -0,0 +1,130 @@
+import gc
+import glob
+import multiprocessing
+import os
+import sys
+import time
+from pathlib import Path
+
+import torch
+
+from config import EMBEDDING_PATH, JOB_PERFORMER_PATH, SUMMARY_MODE
+from pipeline import load_summarizer, run
+from score import load_embedder
+
+JOBS_DIR = "/app/input/jobs"    # one input.json-style spec per job
+OUTPUT_DIR = "output"
+WORKERS = os.cpu_count() or 1
+WORKER_THREADS = 1              # torch threads per forked worker
+BENCHMARK_WORKERS = (1, 2, 4)
+
+
+# --- MODEL PRELOAD ---
+def preload_models():
+    """Load both models once in the parent so forked workers share the weights copy-on-write."""
+    # from_pretrained copies the weights into ordinary process memory (the safetensors files are not kept
+    # mapped), so sharing comes only from fork: children read the parent's pages until they write to them
+    embedder = load_embedder(EMBEDDING_PATH)
+    summarizer = load_summarizer(JOB_PERFORMER_PATH) if SUMMARY_MODE != "extractive" else None
+    torch.set_grad_enabled(False)
+    # Objects that exist now are never scanned by the GC again, so children do not dirty their pages
+    gc.collect()
+    gc.freeze()
+    return embedder, summarizer
+
+
+# --- MEMORY ACCOUNTING ---
+def memory_kb():
+    # RSS counts shared weight pages in full; PSS splits them between the processes sharing them
+    usage = {"rss_kb": 0, "pss_kb": 0}
+    try:
+        with open("/proc/self/smaps_rollup", "r") as f:
+            for line in f:
+                if line.startswith("Rss:"):
+                    usage["rss_kb"] = int(line.split()[1])
+                elif line.startswith("Pss:"):
+                    usage["pss_kb"] = int(line.split()[1])
+    except OSError:
+        pass
+    return usage
+
+
+# --- WORKERS ---
+def init_worker(threads):
+    torch.set_num_threads(threads)
+
+
+def run_job(input_path):
+    start = time.perf_counter()
+    output_path = os.path.join(OUTPUT_DIR, Path(input_path).stem + "_output.json")
+    try:
+        # load_embedder/load_summarizer are cached, so run() picks up the parent's models
+        run(input_path=input_path, output_path=output_path)
+        error = None
+    except Exception as e:
+        error = str(e)
+    return {
+        "job": os.path.basename(input_path),
+        "pid": os.getpid(),
+        "seconds": time.perf_counter() - start,
+        "error": error,
+        **memory_kb()
+    }
+
+
+def run_pool(jobs, workers=WORKERS, threads=WORKER_THREADS):
+    ctx = multiprocessing.get_context("fork")
+    start = time.perf_counter()
+    with ctx.Pool(workers, initializer=init_worker, initargs=(threads,)) as pool:
+        results = list(pool.imap_unordered(run_job, jobs))
+    wall = time.perf_counter() - start
+
+    per_worker = {}
+    for r in results:
+        w = per_worker.setdefault(r["pid"], {"jobs": 0, "rss_kb": 0, "pss_kb": 0})
+        w["jobs"] += 1
+        w["rss_kb"] = max(w["rss_kb"], r["rss_kb"])
+        w["pss_kb"] = max(w["pss_kb"], r["pss_kb"])
+
+    for r in results:
+        if r["error"]:
+            print(f"Failed: {r['job']} - {r['error']}")
+    return {"workers": workers, "jobs": len(results), "seconds": wall,
+            "jobs_per_second": len(results) / wall if wall else 0.0, "per_worker": per_worker}
+
+
+def print_summary(summary, parent):
+    print(f"👷 {summary['workers']} workers: {summary['jobs']} jobs in {summary['seconds']:.2f}s "
+          f"({summary['jobs_per_second']:.2f} jobs/s), parent RSS {parent['rss_kb'] / 1024:.0f} MB")
+    for pid, w in sorted(summary["per_worker"].items()):
+        print(f"   pid {pid}: {w['jobs']} jobs, RSS {w['rss_kb'] / 1024:.0f} MB, PSS {w['pss_kb'] / 1024:.0f} MB")
+
+
+def benchmark(jobs, worker_counts=BENCHMARK_WORKERS):
+    preload_models()
+    parent = memory_kb()
+    base = None
+    for workers in worker_counts:
+        summary = run_pool(jobs, workers)
+        print_summary(summary, parent)
+        base = base or summary["jobs_per_second"]
+        if base:
+            print(f"   scaling vs {worker_counts[0]} worker(s): {summary['jobs_per_second'] / base:.2f}x")
+
+
+def main():
+    jobs = sorted(glob.glob(os.path.join(JOBS_DIR, "*.json")))
+    if not jobs:
+        print(f"❌ No job specs found in {JOBS_DIR}")
+        return
+
+    if len(sys.argv) > 1 and sys.argv[1] == "benchmark":
+        benchmark(jobs)
+        return
+
+    preload_models()
+    print_summary(run_pool(jobs), memory_kb())
+
+
+if __name__ == "__main__":
+    main()